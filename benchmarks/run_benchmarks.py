@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+# Benchmark harness for the pipeline stages.
+# Every case (number of tickers x years of history) gets a scratch directory with
+# synthetic prices generated offline. The stages then run there as subprocesses,
+# exactly like `python src/<script>.py` from the repo root, so each stage's wall
+# time and peak RSS (from os.wait4) are measured in isolation. Results are saved
+# as JSON and compared against a stored baseline.
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+src_dir = os.path.join(repo_dir, 'src')
+results_dir = os.path.join(repo_dir, 'benchmarks', 'results')
+baseline_path = os.path.join(repo_dir, 'benchmarks', 'baseline.json')
+
+trading_days_per_year = 252
+forecast_horizons = [7, 30, 90, 180]
+app_sample_tickers = 20
+
+# Streamlit loaders: what the dashboard reads when a user clicks through tickers.
+# The results index is built once from the model_results store (as the app's
+# cached get_results_index does); each ticker then costs a projected features read
+# plus one index lookup per horizon.
+app_loader_code = f'''
+import sys
+sys.path.insert(0, {src_dir!r})
+sys.path.insert(0, {os.path.join(repo_dir, 'streamlit_app')!r})
+from data_store import read_store, list_tickers
+from results_index import load_results_table, build_results_index
+feature_columns = ['Date', 'Close', 'SMA_20', 'SMA_50', 'EMA_20', 'RSI_14', 'MACD', 'MACD_Signal',
+                   'BB_Middle', 'BB_Upper', 'BB_Lower', 'Volatility_20']
+index = build_results_index(load_results_table())
+for ticker in list_tickers('features')[:{app_sample_tickers}]:
+    read_store('features', columns=feature_columns, tickers=[ticker], memory_map=True)
+    for horizon in {forecast_horizons}:
+        index.get((ticker, horizon))
+'''
+
+
+def script(name, *args):
+    return [sys.executable, os.path.join(src_dir, name), *args]
+
+
+# name -> (command(case), input rows(case)); stages run in this order
+stages = {
+    'download': (lambda case: script('download_and_eda.py', '--source', 'local', '--start', case['start'],
+                                     '--end', case['end'], '--tickers', *case['tickers']),
+                 lambda case: case['rows']),
+    'features': (lambda case: script('feature_engineering.py'), lambda case: case['rows']),
+    'sarima': (lambda case: script('model_sarima.py', '--no-cache'), lambda case: case['rows'] * len(forecast_horizons)),
+    'arima_prophet': (lambda case: script('model_arima_prophet.py', '--no-cache'),
+                      lambda case: case['rows'] * len(forecast_horizons)),
+    'merge': (lambda case: script('merge_model_results.py'),
+              lambda case: len(case['tickers']) * sum(forecast_horizons)),
+    'app_loaders': (lambda case: [sys.executable, '-c', app_loader_code],
+                    lambda case: min(len(case['tickers']), app_sample_tickers) * case['days']),
+}
+# Stages read what earlier stages wrote, so selecting one also runs these
+requires = {'features': ['download'], 'sarima': ['features'], 'arima_prophet': ['features'],
+            'merge': ['features'], 'app_loaders': ['merge']}
+# Model fits take hours on the larger cases, so they only run when asked for
+default_stages = ['download', 'features', 'merge', 'app_loaders']
+
+
+def generate_prices(workdir, n_tickers, years, seed=0):
+    # Geometric random walks written as data/{ticker}_10y.csv, the layout the
+    # offline LocalCSVSource serves, plus placeholder model outputs so the merge
+    # and app stages have input without running the model stages
+    rng = np.random.default_rng(seed)
+    days = trading_days_per_year * years
+    dates = pd.bdate_range(end='2023-12-29', periods=days)
+    returns = rng.normal(0.0003, 0.02, size=(n_tickers, days))
+    close = 100 * np.exp(np.cumsum(returns, axis=1))
+    spread = np.abs(rng.normal(0, 0.01, size=close.shape)) * close
+    volume = rng.integers(100_000, 10_000_000, size=close.shape)
+    tickers = [f'SYN{i:04d}' for i in range(n_tickers)]
+    os.makedirs(os.path.join(workdir, 'data', 'model_outputs'), exist_ok=True)
+    for i, ticker in enumerate(tickers):
+        pd.DataFrame({
+            'Date': dates, 'Open': close[i] - spread[i] / 2, 'High': close[i] + spread[i],
+            'Low': close[i] - spread[i], 'Close': close[i], 'Volume': volume[i],
+        }).to_csv(os.path.join(workdir, 'data', f'{ticker}_10y.csv'), index=False)
+        for horizon in forecast_horizons:
+            test = pd.DataFrame({'Date': dates[-horizon:], 'Actual': close[i, -horizon:]})
+            forecast = test['Actual'].to_numpy() * (1 + rng.normal(0, 0.02, size=horizon))
+            test.assign(ARIMA_Forecast=forecast, Prophet_Forecast=forecast).to_csv(
+                os.path.join(workdir, 'data', 'model_outputs', f'{ticker}_arima_prophet_results_{horizon}.csv'), index=False)
+            test.assign(SARIMA_Forecast=forecast).to_csv(
+                os.path.join(workdir, 'data', 'model_outputs', f'{ticker}_sarima_results_{horizon}.csv'), index=False)
+    return {'tickers': tickers, 'days': days, 'rows': n_tickers * days,
+            'start': dates[0].strftime('%Y-%m-%d'), 'end': '2024-01-01'}
+
+
+def run_stage(command, workdir, log_path):
+    # Runs one stage and returns (exit code, wall time in s, peak RSS in MB)
+    with open(log_path, 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_time = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return os.waitstatus_to_exitcode(status), wall_time, usage.ru_maxrss * scale / 2**20
+
+
+def run_case(n_tickers, years, stage_names, keep=False):
+    workdir = tempfile.mkdtemp(prefix=f'bench_{n_tickers}x{years}y_')
+    print(f'\n{n_tickers} tickers x {years} years: generating synthetic prices in {workdir}...')
+    case = generate_prices(workdir, n_tickers, years)
+    rows = []
+    for name in stage_names:
+        command, input_rows = stages[name]
+        log_path = os.path.join(workdir, f'{name}.log')
+        code, wall_time, peak_rss = run_stage(command(case), workdir, log_path)
+        row = {
+            'stage': name,
+            'tickers': n_tickers,
+            'years': years,
+            'rows': input_rows(case),
+            'wall_time_s': round(wall_time, 3),
+            'peak_rss_mb': round(peak_rss, 1),
+            'rows_per_s': round(input_rows(case) / wall_time, 1),
+            'status': 'ok' if code == 0 else f'exit {code}',
+        }
+        rows.append(row)
+        print(f"  {name:<14} {row['wall_time_s']:>9.2f}s {row['peak_rss_mb']:>8.1f} MB "
+              f"{row['rows_per_s']:>12.0f} rows/s  {row['status']}")
+        if code != 0:
+            with open(log_path) as log:
+                print('    ' + '    '.join(log.readlines()[-5:]))
+    if keep:
+        print(f'  Kept {workdir}')
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def find_regressions(results, baseline, threshold):
+    # A stage regresses when its wall time or peak RSS grew by more than threshold
+    reference = {(r['stage'], r['tickers'], r['years']): r for r in baseline['results']}
+    regressions = []
+    for row in results:
+        base = reference.get((row['stage'], row['tickers'], row['years']))
+        if base is None or row['status'] != 'ok' or base['status'] != 'ok':
+            continue
+        for metric in ['wall_time_s', 'peak_rss_mb']:
+            if row[metric] > base[metric] * (1 + threshold):
+                regressions.append({**{k: row[k] for k in ['stage', 'tickers', 'years']}, 'metric': metric,
+                                    'baseline': base[metric], 'current': row[metric],
+                                    'change_pct': round(100 * (row[metric] / base[metric] - 1), 1)})
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic data.')
+    parser.add_argument('--tickers', nargs='*', type=int, default=[10, 100, 1000], help='Universe sizes to run')
+    parser.add_argument('--years', nargs='*', type=int, default=[1, 10, 30], help='Years of daily history')
+    parser.add_argument('--stages', nargs='*', choices=list(stages), default=default_stages,
+                        help='Stages to run (sarima and arima_prophet are slow on large cases)')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown flagged as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help=f'Store this run as {baseline_path}')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch directories for inspection')
+    args = parser.parse_args()
+
+    selected = set(args.stages)
+    for name in reversed(list(stages)):
+        if name in selected:
+            selected.update(requires.get(name, []))
+    stage_names = [name for name in stages if name in selected]
+    results = []
+    for n_tickers in args.tickers:
+        for years in args.years:
+            results.extend(run_case(n_tickers, years, stage_names, args.keep))
+
+    run = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"benchmark_{run['timestamp'].replace(':', '')}.json")
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f'\nResults saved as {path}')
+
+    exit_code = 0
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f'Baseline saved as {baseline_path}')
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+        if regressions:
+            print(f'\nRegressions against the baseline (> {args.threshold:.0%}):')
+            print(pd.DataFrame(regressions).to_string(index=False))
+            exit_code = 1
+        else:
+            print('No regressions against the baseline.')
+    if any(row['status'] != 'ok' for row in results):
+        exit_code = 1
+    sys.exit(exit_code)
@@ -0,0 +1,135 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+from task_runner import Task, run_tasks, print_timing_report, default_workers
+from model_utils import load_close_series
+from model_arima_prophet import arima_order
+from model_sarima import sarima_order, sarima_seasonal_order
+from instrumentation import span, write_run_report
+
+# Rolling-origin backtesting.
+# Instead of one train/test split per horizon, every model is evaluated from many
+# forecast origins (expanding window). The model is fitted once on the data before
+# the first origin; each later origin only runs the Kalman filter over the new
+# observations (statsmodels `extend`, parameters held fixed) and forecasts from
+# there. Errors for all origins and horizons are then scored at once with NumPy.
+
+forecast_horizons = [7, 30, 90, 180]
+backtest_models = ['ARIMA', 'SARIMA', 'Naive']
+
+
+def forecast_origins(n_obs, n_origins, step, max_horizon):
+    # Expanding-window cutoffs; the last origin still has max_horizon actuals after it
+    last = n_obs - max_horizon
+    cutoffs = last - step * np.arange(n_origins)[::-1]
+    return cutoffs[cutoffs > max(50, step)]
+
+
+def fit_model(model, train):
+    if model == 'ARIMA':
+        return ARIMA(train, order=arima_order).fit()
+    return SARIMAX(train, order=sarima_order, seasonal_order=sarima_seasonal_order).fit(disp=False)
+
+
+def backtest_forecasts(model, values, cutoffs, max_horizon):
+    # Returns an (origins x max_horizon) matrix of forecasts
+    values = np.asarray(values, dtype=float)
+    forecasts = np.empty((len(cutoffs), max_horizon))
+    if model == 'Naive':
+        # Last observed value carried forward
+        last_observed = pd.Series(values).ffill().to_numpy()
+        forecasts[:] = last_observed[cutoffs - 1][:, None]
+        return forecasts
+    with span('fit'):
+        fit = fit_model(model, values[:cutoffs[0]])
+    end = cutoffs[0]
+    with span('forecast', Origins=len(cutoffs)):
+        for i, cutoff in enumerate(cutoffs):
+            if cutoff > end:
+                fit = fit.extend(values[end:cutoff])
+                end = cutoff
+            forecasts[i] = fit.forecast(steps=max_horizon)
+    return forecasts
+
+
+def score_forecasts(forecasts, values, cutoffs, horizons):
+    # Vectorized MAE/RMSE/MAPE over all origins for each horizon
+    values = np.asarray(values, dtype=float)
+    max_horizon = forecasts.shape[1]
+    actuals = values[cutoffs[:, None] + np.arange(max_horizon)]
+    errors = forecasts - actuals
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_errors = np.abs(errors / actuals) * 100
+    rows = []
+    for horizon in horizons:
+        e = errors[:, :horizon]
+        rows.append({
+            'Horizon': horizon,
+            'Origins': len(cutoffs),
+            'MAE': np.nanmean(np.abs(e)),
+            'RMSE': np.sqrt(np.nanmean(e ** 2)),
+            'MAPE': np.nanmean(pct_errors[:, :horizon]),
+            # Error at the horizon itself (last step), averaged over origins
+            'MAE_At_Horizon': np.nanmean(np.abs(e[:, -1])),
+        })
+    return rows
+
+
+def backtest_task(model, values, cutoffs, horizons):
+    forecasts = backtest_forecasts(model, values, cutoffs, max(horizons))
+    with span('score'):
+        return score_forecasts(forecasts, values, cutoffs, horizons)
+
+
+def main(tickers=None, models=backtest_models, n_origins=20, step=5, workers=None, timeout=None):
+    started = time.time()
+    with span('load'):
+        series = load_close_series(tickers)
+    tasks = []
+    for ticker, close in series.items():
+        cutoffs = forecast_origins(len(close), n_origins, step, max(forecast_horizons))
+        if len(cutoffs) == 0:
+            print(f'Skipping {ticker}: not enough history for a backtest')
+            continue
+        for model in models:
+            tasks.append(Task((ticker, model), backtest_task, (model, close.to_numpy(), cutoffs, forecast_horizons)))
+
+    metrics = {}
+
+    def on_result(result):
+        ticker, model = result.key
+        if result.status != 'ok':
+            print(f'  {model} backtest failed for {ticker}: {result.status}')
+            return
+        print(f'  {model} backtest for {ticker} finished in {result.wall_time:.1f}s')
+        metrics.setdefault(ticker, []).extend({'Ticker': ticker, 'Model': model, **row} for row in result.value)
+
+    print(f'Backtesting {", ".join(models)} for {len(series)} tickers ({n_origins} origins, every {step} days)...')
+    with span('tasks'):
+        results = run_tasks(tasks, workers=workers, timeout=timeout, on_result=on_result)
+    os.makedirs('data/model_outputs', exist_ok=True)
+    with span('write_csv'):
+        for ticker, rows in metrics.items():
+            table = pd.DataFrame(rows).sort_values(['Horizon', 'MAE']).reset_index(drop=True)
+            path = f'data/model_outputs/{ticker}_backtest_metrics.csv'
+            table.to_csv(path, index=False)
+            print(f'Backtest metrics saved as {path}')
+    print_timing_report(results, ['Ticker', 'Model'], 'data/run_reports/backtest_task_timings.csv')
+    write_run_report('backtest', results, ['Ticker', 'Model'], started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest of the forecasting models.')
+    parser.add_argument('--tickers', nargs='*', help='Tickers to backtest (default: all)')
+    parser.add_argument('--models', nargs='*', choices=backtest_models, default=backtest_models)
+    parser.add_argument('--origins', type=int, default=20, help='Number of forecast origins per ticker')
+    parser.add_argument('--step', type=int, default=5, help='Trading days between consecutive origins')
+    parser.add_argument('--workers', type=int, default=default_workers(), help='Number of worker processes')
+    parser.add_argument('--timeout', type=float, default=1800, help='Per-task timeout in seconds')
+    args = parser.parse_args()
+    main(args.tickers, args.models, args.origins, args.step, args.workers, args.timeout)
@@ -0,0 +1,112 @@
+import argparse
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from model_utils import load_close_series
+
+# Batched ARIMA(p, d, 0) engine.
+# Fits the whole ticker universe as one vectorized problem: all series are stacked
+# into a (tickers x time) array, differenced d times, and the AR(p) coefficients of
+# every series are estimated at once with batched least squares (one p x p solve
+# per series via np.linalg.solve). Forecasts are produced by running the AR
+# recursion for all series together and integrating back to price levels.
+# Matches statsmodels' ARIMA(p, d, 0) (no trend) within a small tolerance: it
+# estimates by conditional least squares instead of exact maximum likelihood.
+
+
+def stack_series(arrays):
+    # Left-pads series of different lengths with NaN and moves missing values to
+    # the front of each row, so every row ends with its observed values in order.
+    # (Missing closes are non-trading days; they are skipped rather than imputed.)
+    length = max(len(a) for a in arrays)
+    stacked = np.full((len(arrays), length), np.nan)
+    for i, a in enumerate(arrays):
+        stacked[i, length - len(a):] = a
+    order = np.argsort(~np.isnan(stacked), axis=1, kind='stable')
+    return np.take_along_axis(stacked, order, axis=1)
+
+
+def fit_ar_batch(values, p, d=1):
+    # values: (series x time) right-aligned array. Returns AR coefficients
+    # (series x p, lag 1 first) estimated on the d-times differenced series.
+    diffs = np.diff(values, n=d, axis=1) if d else values
+    windows = sliding_window_view(diffs, p + 1, axis=1)
+    y = windows[..., -1]
+    X = windows[..., :-1][..., ::-1]
+    valid = ~np.isnan(y) & ~np.isnan(X).any(axis=-1)
+    X = np.where(valid[..., None], X, 0.0)
+    y = np.where(valid, y, 0.0)
+    XtX = np.einsum('kti,ktj->kij', X, X)
+    Xty = np.einsum('kti,kt->ki', X, y)
+    # Tiny ridge keeps the solve well-posed for short or constant series
+    ridge = (1e-10 * np.trace(XtX, axis1=1, axis2=2) + 1e-12)[:, None, None] * np.eye(p)
+    return np.linalg.solve(XtX + ridge, Xty[..., None])[..., 0]
+
+
+def forecast_ar_batch(values, coef, steps, d=1):
+    # Forecasts `steps` ahead from the end of every row of `values`
+    levels = []
+    current = values
+    for _ in range(d):
+        levels.append(current[:, -1])
+        current = np.diff(current, axis=1)
+    p = coef.shape[1]
+    history = current[:, -p:].copy()
+    forecasts = np.empty((len(values), steps))
+    for step in range(steps):
+        next_value = np.einsum('kj,kj->k', coef, history[:, ::-1])
+        forecasts[:, step] = next_value
+        history = np.concatenate([history[:, 1:], next_value[:, None]], axis=1)
+    # Undo the differencing, innermost level first
+    for last in reversed(levels):
+        forecasts = last[:, None] + np.cumsum(forecasts, axis=1)
+    return forecasts
+
+
+def batched_arima_forecasts(series, horizons, order, fit_mode='refit'):
+    # series: {ticker: Close series}. Returns {ticker: {horizon: {'forecast', 'params'}}}
+    # in the same shape as the per-series model tasks. In 'shared' mode the
+    # coefficients fitted on the shortest training window are reused for every
+    # horizon; in 'refit' mode each horizon gets its own batched fit.
+    p, d, q = order
+    if q != 0:
+        raise ValueError(f'The batched engine only supports ARIMA(p, d, 0), got {order}')
+    tickers = list(series)
+    results = {ticker: {} for ticker in tickers}
+    shared_coef = None
+    for horizon in sorted(horizons, reverse=True):
+        train = stack_series([np.asarray(series[t], dtype=float)[:-horizon] for t in tickers])
+        if fit_mode == 'refit' or shared_coef is None:
+            coef = fit_ar_batch(train, p, d)
+            shared_coef = coef
+        forecasts = forecast_ar_batch(train, shared_coef, horizon, d)
+        for i, ticker in enumerate(tickers):
+            results[ticker][horizon] = {'forecast': forecasts[i], 'params': shared_coef[i]}
+    return results
+
+
+def verify_against_statsmodels(series, order, horizon, rtol=0.01):
+    # Compares batched forecasts with per-series statsmodels fits
+    from statsmodels.tsa.arima.model import ARIMA
+    batched = batched_arima_forecasts(series, [horizon], order)
+    worst = 0.0
+    for ticker, close in series.items():
+        train = np.asarray(close, dtype=float)[:-horizon]
+        reference = np.asarray(ARIMA(train, order=order).fit().forecast(steps=horizon))
+        diff = np.max(np.abs(batched[ticker][horizon]['forecast'] - reference) / np.abs(reference))
+        worst = max(worst, diff)
+        print(f'{ticker}: max relative forecast difference {diff:.2e}')
+    ok = worst <= rtol
+    print(f'{"OK" if ok else "FAILED"}: worst relative difference {worst:.2e} (tolerance {rtol:.0e})')
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the batched ARIMA engine against statsmodels.')
+    parser.add_argument('--tickers', nargs='*', help='Tickers to check (default: all)')
+    parser.add_argument('--horizon', type=int, default=30)
+    parser.add_argument('--rtol', type=float, default=0.01, help='Allowed relative forecast difference')
+    args = parser.parse_args()
+    from model_arima_prophet import arima_order
+    ok = verify_against_statsmodels(load_close_series(args.tickers), arima_order, args.horizon, args.rtol)
+    raise SystemExit(0 if ok else 1)
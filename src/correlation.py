@@ -0,0 +1,227 @@
+import argparse
+import heapq
+import os
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, leaves_list, fcluster
+from scipy.spatial.distance import squareform
+
+from data_store import read_store
+from instrumentation import span, write_run_report
+
+# Cross-ticker correlation analytics.
+# Prices are turned into one aligned (dates x tickers) matrix of daily log returns
+# (each ticker's return is taken over its own consecutive bars, so holidays that
+# differ between markets do not break the alignment). Correlations are Pearson over
+# the dates both tickers have, computed with NumPy matrix products one block of
+# tickers against another, so memory per step is bounded by the block size and
+# the top-k pairs can be found without holding the whole matrix. CorrelationState
+# keeps the running sums for rolling/expanding windows updated one bar at a time.
+
+default_block_size = 256
+default_min_periods = 60
+
+
+# --- Returns matrix ---
+
+def returns_matrix(prices, column='Close', start=None):
+    # prices: long frame (Ticker, Date, column). Returns (dates, tickers, returns)
+    # with returns a float64 (dates x tickers) array, NaN where a ticker has no bar
+    df = prices[['Ticker', 'Date', column]].dropna()
+    df = df[df[column] > 0].sort_values(['Ticker', 'Date'], kind='stable')
+    tickers = pd.Categorical(df['Ticker'].astype(str))
+    codes = tickers.codes
+    values = np.log(df[column].to_numpy(dtype=float))
+    returns = np.diff(values, prepend=np.nan)
+    returns[np.r_[True, codes[1:] != codes[:-1]]] = np.nan  # first bar of every ticker
+    dates, date_codes = np.unique(df['Date'].to_numpy(), return_inverse=True)
+    matrix = np.full((len(dates), len(tickers.categories)), np.nan)
+    matrix[date_codes, codes] = returns
+    dates = pd.DatetimeIndex(dates)
+    if start is not None:
+        keep = dates >= pd.Timestamp(start)
+        dates, matrix = dates[keep], matrix[keep]
+    return dates, list(tickers.categories), matrix
+
+
+# --- Blocked pairwise-complete correlation ---
+
+def _block_sums(x, mask_x, y, mask_y):
+    # Sums over the rows where both columns are observed (x, y are zero-filled)
+    n = mask_x.T @ mask_y
+    sx = x.T @ mask_y
+    sy = mask_x.T @ y
+    sxx = (x * x).T @ mask_y
+    syy = mask_x.T @ (y * y)
+    sxy = x.T @ y
+    return n, sx, sy, sxx, syy, sxy
+
+
+def _corr_from_sums(n, sx, sy, sxx, syy, sxy, min_periods):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = n * sxy - sx * sy
+        corr = cov / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+    corr[n < min_periods] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlation_blocks(returns, block_size=default_block_size, min_periods=default_min_periods):
+    # Yields (i0, j0, block, counts) for the upper-triangle blocks (j0 >= i0) of
+    # the ticker x ticker correlation matrix; counts are the overlapping returns.
+    # Centering by the column means keeps the sums well conditioned; a shift does
+    # not change any pairwise correlation.
+    mask = ~np.isnan(returns)
+    means = np.nansum(returns, axis=0) / np.maximum(mask.sum(axis=0), 1)
+    centered = np.where(mask, returns - means, 0.0)
+    weights = mask.astype(float)
+    k = returns.shape[1]
+    for i0 in range(0, k, block_size):
+        xi, mi = centered[:, i0:i0 + block_size], weights[:, i0:i0 + block_size]
+        for j0 in range(i0, k, block_size):
+            xj, mj = centered[:, j0:j0 + block_size], weights[:, j0:j0 + block_size]
+            sums = _block_sums(xi, mi, xj, mj)
+            yield i0, j0, _corr_from_sums(*sums, min_periods), sums[0]
+
+
+def correlation_matrix(returns, block_size=default_block_size, min_periods=default_min_periods):
+    k = returns.shape[1]
+    corr = np.full((k, k), np.nan)
+    for i0, j0, block, _ in correlation_blocks(returns, block_size, min_periods):
+        corr[i0:i0 + block.shape[0], j0:j0 + block.shape[1]] = block
+        corr[j0:j0 + block.shape[1], i0:i0 + block.shape[0]] = block.T
+    return corr
+
+
+def top_pairs(returns, tickers, k=20, absolute=False, block_size=default_block_size, min_periods=default_min_periods):
+    # The k most correlated ticker pairs (by |corr| with absolute=True), found block
+    # by block with a bounded heap instead of sorting the full matrix
+    heap = []
+    for i0, j0, block, counts in correlation_blocks(returns, block_size, min_periods):
+        rows, cols = np.indices(block.shape)
+        keep = (i0 + rows < j0 + cols) & ~np.isnan(block)
+        score = np.abs(block) if absolute else block
+        candidates = np.flatnonzero(keep)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(score.ravel()[candidates], -k)[-k:]]
+        for flat in candidates:
+            r, c = divmod(int(flat), block.shape[1])
+            item = (float(score[r, c]), i0 + r, j0 + c, float(block[r, c]), int(counts[r, c]))
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    rows = [{'Ticker_A': tickers[a], 'Ticker_B': tickers[b], 'Correlation': corr, 'Observations': n}
+            for _, a, b, corr, n in sorted(heap, reverse=True)]
+    return pd.DataFrame(rows, columns=['Ticker_A', 'Ticker_B', 'Correlation', 'Observations'])
+
+
+# --- Rolling / incremental ---
+
+class CorrelationState:
+    # Running pairwise sums over the last `window` bars (all bars when window is
+    # None). update() costs O(tickers^2) per bar, whatever the history length.
+    def __init__(self, n_tickers, window=None, min_periods=default_min_periods):
+        self.window = window
+        self.min_periods = min_periods
+        self.rows = deque()
+        self.sums = [np.zeros((n_tickers, n_tickers)) for _ in range(6)]
+
+    def _apply(self, row, sign):
+        mask = ~np.isnan(row)
+        x = np.where(mask, row, 0.0)[None, :]
+        m = mask.astype(float)[None, :]
+        for total, part in zip(self.sums, _block_sums(x, m, x, m)):
+            total += sign * part
+
+    def update(self, row):
+        row = np.asarray(row, dtype=float)
+        self._apply(row, 1.0)
+        if self.window is not None:
+            self.rows.append(row)
+            if len(self.rows) > self.window:
+                self._apply(self.rows.popleft(), -1.0)
+
+    def correlation(self):
+        return _corr_from_sums(*self.sums, self.min_periods)
+
+
+def pair_rolling_correlation(x, y, window, min_periods=None):
+    # Rolling correlation of two aligned return columns via cumulative sums
+    # (NaN until the first full window)
+    min_periods = window // 2 if min_periods is None else min_periods
+    both = ~np.isnan(x) & ~np.isnan(y)
+    x, y = np.where(both, x, 0.0), np.where(both, y, 0.0)
+    # Center like correlation_blocks to keep the running sums well conditioned
+    if both.any():
+        x, y = np.where(both, x - x[both].mean(), 0.0), np.where(both, y - y[both].mean(), 0.0)
+
+    def rolling_sum(a):
+        c = np.concatenate([[0.0], np.cumsum(a)])
+        return c[window:] - c[:-window] if len(a) >= window else np.empty(0)
+
+    n, sx, sy = rolling_sum(both.astype(float)), rolling_sum(x), rolling_sum(y)
+    sxx, syy, sxy = rolling_sum(x * x), rolling_sum(y * y), rolling_sum(x * y)
+    out = np.full(len(x), np.nan)
+    if len(n):
+        out[window - 1:] = _corr_from_sums(n, sx, sy, sxx, syy, sxy, min_periods)
+    return out
+
+
+# --- Clustering ---
+
+def cluster_tickers(corr, max_distance=0.5):
+    # Average-linkage clustering on the correlation distance sqrt((1 - corr) / 2);
+    # the default cut groups tickers whose average correlation is above 0.5.
+    # Returns (leaf order for plotting, cluster label per ticker)
+    if len(corr) < 2:
+        return np.arange(len(corr)), np.ones(len(corr), dtype=int)
+    distance = np.sqrt(np.clip((1 - np.nan_to_num(corr, nan=0.0)) / 2, 0.0, 1.0))
+    np.fill_diagonal(distance, 0.0)
+    tree = linkage(squareform(distance, checks=False), method='average')
+    return leaves_list(tree), fcluster(tree, t=max_distance, criterion='distance')
+
+
+def correlation_analytics(prices, start=None, top=20, block_size=default_block_size, min_periods=default_min_periods):
+    # Everything the dashboard and the EDA need, from one pass over the prices
+    with span('returns_matrix'):
+        dates, tickers, returns = returns_matrix(prices, start=start)
+    with span('correlation', Tickers=len(tickers)):
+        corr = correlation_matrix(returns, block_size, min_periods)
+    with span('cluster'):
+        order, labels = cluster_tickers(corr)
+    with span('top_pairs'):
+        pairs = top_pairs(returns, tickers, top, block_size=block_size, min_periods=min_periods)
+    clusters = pd.DataFrame({'Ticker': tickers, 'Cluster': labels}).iloc[order].reset_index(drop=True)
+    return {'dates': dates, 'tickers': tickers, 'returns': returns, 'corr': corr, 'order': order,
+            'clusters': clusters, 'top_pairs': pairs}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cross-ticker return correlations, clusters and top correlated pairs.')
+    parser.add_argument('--tickers', nargs='*', help='Tickers to include (default: all in the prices store)')
+    parser.add_argument('--start', help='Only use returns from this date on')
+    parser.add_argument('--top', type=int, default=20, help='Number of most correlated pairs to report')
+    parser.add_argument('--block-size', type=int, default=default_block_size, help='Tickers per correlation block')
+    parser.add_argument('--min-periods', type=int, default=default_min_periods, help='Minimum overlapping returns per pair')
+    parser.add_argument('--csv', action='store_true', help='Also export the top pairs, clusters and matrix as CSVs')
+    args = parser.parse_args()
+    started = time.time()
+    with span('load'):
+        prices = read_store('prices', columns=['Date', 'Close'], tickers=args.tickers)
+    analytics = correlation_analytics(prices, args.start, args.top, args.block_size, args.min_periods)
+    print(f"Correlations of daily log returns for {len(analytics['tickers'])} tickers over {len(analytics['dates'])} dates")
+    print(f'\nTop {args.top} correlated pairs:')
+    print(analytics['top_pairs'].to_string(index=False))
+    print(f"\n{analytics['clusters']['Cluster'].nunique()} clusters:")
+    for cluster, members in analytics['clusters'].groupby('Cluster', sort=False)['Ticker']:
+        print(f'  {cluster}: {", ".join(members)}')
+    if args.csv:
+        os.makedirs('data/analytics', exist_ok=True)
+        analytics['top_pairs'].to_csv('data/analytics/top_correlated_pairs.csv', index=False)
+        analytics['clusters'].to_csv('data/analytics/ticker_clusters.csv', index=False)
+        pd.DataFrame(analytics['corr'], index=analytics['tickers'], columns=analytics['tickers']).to_csv(
+            'data/analytics/return_correlations.csv')
+        print('CSVs saved in data/analytics/')
+    write_run_report('correlation', started=started)
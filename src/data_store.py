@@ -0,0 +1,201 @@
+import os
+import json
+import shutil
+import uuid
+from urllib.parse import quote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+# Columnar data store shared by every pipeline stage.
+# Each dataset (prices, features, ...) is a directory of Parquet files partitioned
+# by ticker (data/store/<name>/Ticker=<ticker>/part-*.parquet) with typed columns:
+# Date as datetime, prices/indicators as float32, forecast horizons as int32 and
+# Ticker as a categorical.
+# Readers can project columns and push ticker/date filters down to the files.
+
+store_dir = 'data/store'
+manifest_name = '_manifest.json'  # files starting with '_' are ignored by pyarrow
+float64_columns = {'Volume'}
+int32_columns = {'Horizon'}
+partitioning = ds.partitioning(pa.schema([('Ticker', pa.string())]), flavor='hive')
+
+
+def dataset_path(name):
+    return os.path.join(store_dir, name)
+
+
+def store_exists(name):
+    return os.path.exists(os.path.join(dataset_path(name), manifest_name))
+
+
+def typed_frame(df):
+    df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Ticker'] = df['Ticker'].astype(str)
+    for column in df.columns:
+        if column in ('Date', 'Ticker') or not pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        if column in int32_columns:
+            df[column] = df[column].astype('int32')
+        else:
+            df[column] = df[column].astype('float64' if column in float64_columns else 'float32')
+    return df
+
+
+def read_manifest(name):
+    path = os.path.join(dataset_path(name), manifest_name)
+    if not os.path.exists(path):
+        return {'columns': [], 'tickers': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(name, manifest):
+    with open(os.path.join(dataset_path(name), manifest_name), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def write_store(df, name, append=False):
+    # Writes df (must have Date and Ticker columns) to the named dataset.
+    # append=True adds new files next to the existing ones instead of replacing them.
+    path = dataset_path(name)
+    if not append and os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path, exist_ok=True)
+    df = typed_frame(df)
+    manifest = read_manifest(name) if append else {'columns': list(df.columns), 'tickers': {}}
+    if len(df):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        ds.write_dataset(table, path, format='parquet', partitioning=partitioning,
+                         basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+                         existing_data_behavior='overwrite_or_ignore')
+    for ticker, dates in df.groupby('Ticker', sort=False)['Date']:
+        entry = manifest['tickers'].get(ticker, {'rows': 0, 'first_date': None, 'last_date': None})
+        first, last = dates.min().strftime('%Y-%m-%d'), dates.max().strftime('%Y-%m-%d')
+        entry['rows'] += len(dates)
+        entry['first_date'] = min(filter(None, [entry['first_date'], first]))
+        entry['last_date'] = max(filter(None, [entry['last_date'], last]))
+        manifest['tickers'][ticker] = entry
+    write_manifest(name, manifest)
+    return path
+
+
+def partition_path(name, ticker):
+    # Directory holding one ticker's files (pyarrow URI-encodes partition values)
+    return os.path.join(dataset_path(name), f"Ticker={quote(str(ticker), safe='')}")
+
+
+def replace_tickers(df, name):
+    # Rewrites only the partitions of the tickers in df; other tickers' files and
+    # their place in the manifest order are kept
+    if not store_exists(name):
+        return write_store(df, name)
+    manifest = read_manifest(name)
+    manifest['columns'] += [c for c in df.columns if c not in manifest['columns']]
+    for ticker in pd.unique(df['Ticker'].astype(str)):
+        shutil.rmtree(partition_path(name, ticker), ignore_errors=True)
+        if ticker in manifest['tickers']:
+            manifest['tickers'][ticker] = {'rows': 0, 'first_date': None, 'last_date': None}
+    write_manifest(name, manifest)
+    return write_store(df, name, append=True)
+
+
+def partition_files(name, ticker):
+    path = partition_path(name, ticker)
+    if not os.path.isdir(path):
+        return []
+    return sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.parquet') and not f.startswith(('_', '.')))
+
+
+def compact_tickers(name, tickers, max_files=8):
+    # Appends add one file per ticker each time; once a ticker's partition holds
+    # more than max_files files they are rewritten as one, sorted by Date, so
+    # repeated appends (e.g. streaming flushes) keep the file count bounded.
+    # The new file is in place before the old ones are removed, and the rows (so
+    # the manifest) do not change. Returns the number of partitions compacted.
+    compacted = 0
+    for ticker in tickers:
+        files = partition_files(name, ticker)
+        if len(files) <= max_files:
+            continue
+        schema = pa.unify_schemas([pq.read_schema(f) for f in files])
+        table = ds.dataset(files, schema=schema, format='parquet').to_table().sort_by('Date')
+        path = partition_path(name, ticker)
+        tmp_path = os.path.join(path, f'_compact-{uuid.uuid4().hex}.parquet')  # ignored by readers until renamed
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(path, f'part-{uuid.uuid4().hex}-0.parquet'))
+        for f in files:
+            os.remove(f)
+        compacted += 1
+    return compacted
+
+
+def open_dataset(name, memory_map=False):
+    path = dataset_path(name)
+    if not store_exists(name):
+        raise FileNotFoundError(f'No {name} dataset in {store_dir}; run the pipeline stage that writes it first.')
+    filesystem = fs.LocalFileSystem(use_mmap=memory_map)
+    return ds.dataset(os.path.abspath(path), format='parquet', filesystem=filesystem,
+                      partitioning=ds.HivePartitioning.discover(infer_dictionary=True))
+
+
+def read_store(name, columns=None, tickers=None, start=None, end=None, memory_map=False):
+    # Reads a dataset into a DataFrame sorted by (Ticker, Date).
+    # columns: projection (Ticker is always included); tickers/start/end are pushed
+    # down so only matching partitions and row groups are read. memory_map maps
+    # the Parquet files instead of reading them into buffers.
+    dataset = open_dataset(name, memory_map)
+    condition = None
+    if tickers is not None:
+        condition = ds.field('Ticker').isin(list(tickers))
+    if start is not None:
+        condition = (ds.field('Date') >= pd.Timestamp(start)) if condition is None else condition & (ds.field('Date') >= pd.Timestamp(start))
+    if end is not None:
+        condition = (ds.field('Date') <= pd.Timestamp(end)) if condition is None else condition & (ds.field('Date') <= pd.Timestamp(end))
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + ['Ticker']))
+    df = dataset.to_table(columns=columns, filter=condition).to_pandas()
+    manifest = read_manifest(name)
+    df = df[[c for c in manifest['columns'] if c in df.columns] + [c for c in df.columns if c not in manifest['columns']]]
+    if 'Ticker' in df.columns:
+        df['Ticker'] = df['Ticker'].astype('category')
+    sort_columns = [c for c in ['Ticker', 'Date'] if c in df.columns]
+    if 'Ticker' in df.columns:
+        # Tickers sort in the order they were written (manifest order)
+        order = [t for t in manifest['tickers'] if t in set(df['Ticker'].cat.categories)]
+        df['Ticker'] = df['Ticker'].cat.reorder_categories(order + [t for t in df['Ticker'].cat.categories if t not in order])
+    if sort_columns:
+        df = df.sort_values(sort_columns, kind='stable').reset_index(drop=True)
+    return df
+
+
+def list_tickers(name):
+    return list(read_manifest(name)['tickers'])
+
+
+def store_version(name):
+    # Changes whenever the dataset is rewritten or appended to (usable as a cache key)
+    path = os.path.join(dataset_path(name), manifest_name)
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def export_csv(df, path):
+    # Optional CSV export (Power BI and other tools that cannot read Parquet)
+    df = df.copy()
+    df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+    df.to_csv(path, index=False)
+    print(f'Exported {path}')
+
+
+def load_prices(csv_path='data/all_stocks_10y.csv'):
+    # Raw prices from the store, falling back to the combined CSV (bootstraps the
+    # store from the CSVs shipped in data/)
+    if store_exists('prices'):
+        return read_store('prices')
+    df = pd.read_csv(csv_path)
+    write_store(df, 'prices')
+    print(f'Imported {csv_path} into {dataset_path("prices")}')
+    return read_store('prices')
@@ -1,91 +1,132 @@
 import os
-import yfinance as yf
+import time
+import argparse
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-print('Script started.')
-
-# Ensure data directory exists
-os.makedirs('data', exist_ok=True)
+from data_store import write_store, replace_tickers, read_store, store_exists, export_csv
+from downloader import sources, download_prices
+from instrumentation import span, write_run_report
+from correlation import correlation_analytics
 
 # List of tickers (add/remove as needed)
 tickers = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'META', 'JPM', 'NFLX', '^NSEI', '^GSPC']
+# Static EDA plots stop being readable beyond this many tickers; larger universes
+# are explored on the dashboard's Correlations page instead
+max_plot_tickers = 30
+
+
+def update_prices(tickers, source, start, end, chunk_size=50, max_workers=4, retries=3, incremental=True):
+    # Downloads the bars missing from the prices store and appends them; with
+    # incremental=False the fetched tickers' partitions are replaced instead.
+    # Tickers that were not fetched (not requested, or in a failed chunk) keep
+    # their stored history. Returns the number of new rows; failed chunks are
+    # reported, not fatal.
+    incremental = incremental and store_exists('prices')
+    new_data, failed = download_prices(tickers, source, start, end, chunk_size=chunk_size,
+                                       max_workers=max_workers, retries=retries, incremental=incremental)
+    if failed:
+        print(f'Failed to download: {", ".join(failed)}')
+    if len(new_data):
+        if incremental:
+            write_store(new_data, 'prices', append=True)
+        else:
+            replace_tickers(new_data, 'prices')
+        print(f'Saved {len(new_data)} new rows to data/store/prices')
+    return len(new_data)
 
-print('Starting data download...')
-try:
-    data = yf.download(tickers, start='2014-01-01', end='2024-01-01', group_by='ticker', auto_adjust=True)
-    print('Data download complete.')
-    print(f'Downloaded data shape: {data.shape}')
-    if data.empty:
-        print('No data was downloaded. Exiting.')
-        exit(1)
-except Exception as e:
-    print(f'Error during data download: {e}')
-    exit(1)
 
-# Save each stock as a separate CSV
-for ticker in tickers:
-    print(f'Processing {ticker}...')
-    try:
-        df = data[ticker].copy()
-        print(f'{ticker} data shape: {df.shape}')
-        df['Ticker'] = ticker
-        df.reset_index(inplace=True)
-        file_path = f'data/{ticker}_10y.csv'
-        df.to_csv(file_path, index=False)
-        print(f'Saved {file_path} ({len(df)} rows)')
-    except Exception as e:
-        print(f'Error saving {ticker}: {e}')
+def run_eda(all_data):
+    # --- Initial EDA ---
+    print('Data Info:')
+    print(all_data.info())
+    print('\nSummary Statistics:')
+    print(all_data.describe())
+    print('\nTicker Counts:')
+    print(all_data['Ticker'].value_counts())
+    print('\nMissing Values:')
+    print(all_data.isnull().sum())
 
-print('Combining all CSVs...')
-# Combine all into one DataFrame for Power BI and EDA
-try:
-    all_data = pd.concat([pd.read_csv(f'data/{ticker}_10y.csv') for ticker in tickers])
-    all_data.to_csv('data/all_stocks_10y.csv', index=False)
-    print('Combined all stocks into data/all_stocks_10y.csv')
-except Exception as e:
-    print(f'Error combining CSVs: {e}')
-    exit(1)
+    n_tickers = all_data['Ticker'].nunique()
+    plot = n_tickers <= max_plot_tickers
+    if not plot:
+        print(f'Skipping the EDA plots for {n_tickers} tickers (more than {max_plot_tickers}); '
+              'see the Correlations page of the Streamlit app')
 
-# --- Initial EDA ---
-print('Data Info:')
-print(all_data.info())
-print('\nSummary Statistics:')
-print(all_data.describe())
-print('\nTicker Counts:')
-print(all_data['Ticker'].value_counts())
-print('\nMissing Values:')
-print(all_data.isnull().sum())
+    # Plot closing prices for all stocks
+    if plot:
+        try:
+            with span('plot_prices'):
+                plt.figure(figsize=(14, 7))
+                for ticker, df in all_data.groupby('Ticker', sort=False, observed=True):
+                    plt.plot(df['Date'], df['Close'], label=ticker)
+                plt.legend()
+                plt.title('Closing Prices of All Stocks (2014-2024)')
+                plt.xlabel('Date')
+                plt.ylabel('Close Price')
+                plt.tight_layout()
+                plt.savefig('data/closing_prices_all_stocks.png')
+                plt.close()
+            print('Saved data/closing_prices_all_stocks.png')
+        except Exception as e:
+            print(f'Error plotting closing prices: {e}')
 
-# Plot closing prices for all stocks
-try:
-    plt.figure(figsize=(14, 7))
-    for ticker in all_data['Ticker'].unique():
-        plt.plot(all_data[all_data['Ticker'] == ticker]['Date'],
-                 all_data[all_data['Ticker'] == ticker]['Close'], label=ticker)
-    plt.legend()
-    plt.title('Closing Prices of All Stocks (2014-2024)')
-    plt.xlabel('Date')
-    plt.ylabel('Close Price')
-    plt.tight_layout()
-    plt.savefig('data/closing_prices_all_stocks.png')
-    plt.close()
-    print('Saved data/closing_prices_all_stocks.png')
-except Exception as e:
-    print(f'Error plotting closing prices: {e}')
+    # Correlations of daily returns, tickers ordered by cluster (src/correlation.py)
+    analytics = correlation_analytics(all_data)
+    print('\nMost correlated pairs (daily log returns):')
+    print(analytics['top_pairs'].head(10).to_string(index=False))
+    if plot:
+        try:
+            with span('correlation_heatmap'):
+                order = analytics['order']
+                labels = [analytics['tickers'][i] for i in order]
+                corr = pd.DataFrame(analytics['corr'][order][:, order], index=labels, columns=labels)
+                sns.heatmap(corr, annot=len(labels) <= 15, fmt='.2f', cmap='coolwarm', vmin=-1, vmax=1)
+                plt.title('Correlation of Daily Returns')
+                plt.tight_layout()
+                plt.savefig('data/correlation_heatmap.png')
+                plt.close()
+            print('Saved data/correlation_heatmap.png')
+        except Exception as e:
+            print(f'Error plotting correlation heatmap: {e}')
 
-# Correlation heatmap (last available day for each stock)
-try:
-    pivot = all_data.pivot_table(index='Date', columns='Ticker', values='Close')
-    corr = pivot.corr()
-    sns.heatmap(corr, annot=True, cmap='coolwarm')
-    plt.title('Correlation of Closing Prices')
-    plt.tight_layout()
-    plt.savefig('data/correlation_heatmap.png')
-    plt.close()
-    print('Saved data/correlation_heatmap.png')
-except Exception as e:
-    print(f'Error plotting correlation heatmap: {e}')
+    print('EDA complete. Check the data/ directory for outputs.')
 
-print('EDA complete. Check the data/ directory for outputs.')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Download stock prices and run the initial EDA.')
+    parser.add_argument('--tickers', nargs='*', default=tickers, help='Tickers to download')
+    parser.add_argument('--source', choices=sorted(sources), default='yahoo',
+                        help='yahoo: Yahoo Finance; local: serve data/{ticker}_10y.csv (offline)')
+    parser.add_argument('--start', default='2014-01-01')
+    parser.add_argument('--end', default='2024-01-01')
+    parser.add_argument('--chunk-size', type=int, default=50, help='Tickers per download request')
+    parser.add_argument('--max-workers', type=int, default=4, help='Concurrent download requests')
+    parser.add_argument('--retries', type=int, default=3, help='Retries per chunk (exponential backoff)')
+    parser.add_argument('--full', action='store_true', help='Re-download the whole date range instead of only new bars')
+    parser.add_argument('--csv', action='store_true', help='Also export per-ticker and combined CSVs (e.g. for Power BI)')
+    args = parser.parse_args()
+
+    print('Script started.')
+    started = time.time()
+    # Ensure data directory exists
+    os.makedirs('data', exist_ok=True)
+    print('Starting data download...')
+    with span('download', Source=args.source):
+        update_prices(args.tickers, sources[args.source](), args.start, args.end, args.chunk_size,
+                      args.max_workers, args.retries, incremental=not args.full)
+    if not store_exists('prices'):
+        print('No data was downloaded. Exiting.')
+        exit(1)
+    with span('load'):
+        all_data = read_store('prices', tickers=args.tickers)
+    if args.csv:
+        with span('export_csv'):
+            for ticker, df in all_data.groupby('Ticker', sort=False, observed=True):
+                export_csv(df, f'data/{ticker}_10y.csv')
+            export_csv(all_data, 'data/all_stocks_10y.csv')
+    run_eda(all_data)
+    write_run_report('download_and_eda', started=started)
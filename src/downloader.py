@@ -0,0 +1,137 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from data_store import read_manifest
+
+# Bulk price downloader.
+# Tickers are split into chunks that are fetched concurrently (bounded number of
+# threads, since fetching is I/O bound), each chunk is retried with exponential
+# backoff on its own, and only bars after each ticker's last stored date are
+# requested. Where the prices come from is pluggable through PriceSource.
+
+price_columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class PriceSource:
+    # fetch() returns {ticker: DataFrame with price_columns} for the given
+    # tickers and [start, end) date range; tickers without data may be omitted
+    name = 'base'
+
+    def fetch(self, tickers, start, end):
+        raise NotImplementedError
+
+
+class YahooSource(PriceSource):
+    name = 'yahoo'
+
+    def fetch(self, tickers, start, end):
+        import yfinance as yf
+        data = yf.download(list(tickers), start=start, end=end, group_by='ticker',
+                           auto_adjust=True, progress=False, threads=False)
+        if data is None or data.empty:
+            raise RuntimeError(f'No data returned for {", ".join(tickers)}')
+        frames = {}
+        for ticker in tickers:
+            if isinstance(data.columns, pd.MultiIndex):
+                if ticker not in data.columns.get_level_values(0):
+                    continue
+                df = data[ticker].copy()
+            else:
+                df = data.copy()
+            df.columns.name = None
+            frames[ticker] = df.reset_index()[price_columns]
+        return frames
+
+
+class LocalCSVSource(PriceSource):
+    # Offline stand-in that serves the data/{ticker}_10y.csv files
+    name = 'local'
+
+    def __init__(self, directory='data', pattern='{ticker}_10y.csv'):
+        self.directory = directory
+        self.pattern = pattern
+
+    def fetch(self, tickers, start, end):
+        frames = {}
+        for ticker in tickers:
+            path = os.path.join(self.directory, self.pattern.format(ticker=ticker))
+            if not os.path.exists(path):
+                continue
+            df = pd.read_csv(path, usecols=price_columns, parse_dates=['Date'])
+            frames[ticker] = df[(df['Date'] >= pd.Timestamp(start)) & (df['Date'] < pd.Timestamp(end))]
+        return frames
+
+
+sources = {'yahoo': YahooSource, 'local': LocalCSVSource}
+
+
+def fetch_with_retry(source, tickers, start, end, retries=3, backoff=1.0):
+    for attempt in range(retries + 1):
+        try:
+            return source.fetch(tickers, start, end)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f'  Fetch of {len(tickers)} tickers from {start} failed ({e}); retrying in {delay:.1f}s')
+            time.sleep(delay)
+
+
+def plan_chunks(tickers, start, end, chunk_size, incremental=True, dataset='prices'):
+    # Groups tickers by the first date they still need and splits every group into
+    # chunks of at most chunk_size tickers. Returns [(tickers, start)].
+    stored = read_manifest(dataset)['tickers'] if incremental else {}
+    by_start = {}
+    for ticker in tickers:
+        ticker_start = pd.Timestamp(start)
+        if ticker in stored:
+            ticker_start = max(ticker_start, pd.Timestamp(stored[ticker]['last_date']) + pd.Timedelta(days=1))
+        if ticker_start >= pd.Timestamp(end):
+            continue
+        by_start.setdefault(ticker_start.strftime('%Y-%m-%d'), []).append(ticker)
+    chunks = []
+    for chunk_start, group in by_start.items():
+        for i in range(0, len(group), chunk_size):
+            chunks.append((group[i:i + chunk_size], chunk_start))
+    return chunks
+
+
+def download_prices(tickers, source, start, end, chunk_size=50, max_workers=4, retries=3, backoff=1.0, incremental=True):
+    # Returns (long DataFrame of new bars with a Ticker column, list of failed tickers)
+    chunks = plan_chunks(tickers, start, end, chunk_size, incremental)
+    if not chunks:
+        print('All tickers are up to date.')
+        return pd.DataFrame(columns=price_columns + ['Ticker']), []
+    print(f'Fetching {sum(len(c) for c, _ in chunks)} tickers in {len(chunks)} chunks from {source.name} '
+          f'({max_workers} concurrent)...')
+    frames = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch_with_retry, source, chunk, chunk_start, end, retries, backoff): (chunk, chunk_start)
+                   for chunk, chunk_start in chunks}
+        for future in as_completed(futures):
+            chunk, chunk_start = futures[future]
+            try:
+                fetched = future.result()
+            except Exception as e:
+                print(f'  Giving up on {", ".join(chunk)}: {e}')
+                failed.extend(chunk)
+                continue
+            for ticker in chunk:
+                df = fetched.get(ticker)
+                if df is None or df.empty:
+                    continue
+                df = df[pd.to_datetime(df['Date']) >= pd.Timestamp(chunk_start)].copy()
+                df['Ticker'] = ticker
+                frames.append(df)
+            print(f'  Fetched {len(chunk)} tickers from {chunk_start}')
+    if not frames:
+        return pd.DataFrame(columns=price_columns + ['Ticker']), failed
+    # Keep the caller's ticker order
+    new_data = pd.concat(frames, ignore_index=True)
+    order = {ticker: i for i, ticker in enumerate(tickers)}
+    new_data = new_data.sort_values(['Ticker', 'Date'], key=lambda c: c.map(order) if c.name == 'Ticker' else c, kind='stable')
+    return new_data.reset_index(drop=True), failed
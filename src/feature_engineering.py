@@ -1,48 +1,308 @@
+import argparse
+import json
 import pandas as pd
 import numpy as np
 import os
+import time
+from numpy.lib.stride_tricks import sliding_window_view
 
-# Load the combined stock data
-df = pd.read_csv('data/all_stocks_10y.csv')
+from data_store import load_prices, read_store, write_store, store_exists, export_csv
+from instrumentation import span, write_run_report
 
-# --- Feature Engineering Functions ---
-def add_technical_indicators(df):
-    # Simple Moving Average (SMA)
-    df['SMA_20'] = df['Close'].rolling(window=20).mean()
-    df['SMA_50'] = df['Close'].rolling(window=50).mean()
-    # Exponential Moving Average (EMA)
-    df['EMA_20'] = df['Close'].ewm(span=20, adjust=False).mean()
+indicator_columns = ['SMA_20', 'SMA_50', 'EMA_20', 'RSI_14', 'MACD', 'MACD_Signal',
+                     'BB_Middle', 'BB_Std', 'BB_Upper', 'BB_Lower', 'Volatility_20']
+
+
+# --- Indicator Engine ---
+# All indicators are computed in one pass over the Close column of a frame that is
+# sorted by (Ticker, Date), so every ticker is a contiguous slice. Rolling windows
+# run over the whole array at once and windows that straddle two tickers are masked
+# out afterwards; EWMs use a grouped ewm so they restart at every ticker.
+
+def rolling_mean(values, window):
+    # Every window is summed on its own (no running sum), so a value depends only
+    # on the `window` inputs it covers and not on the history before them
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        windows = sliding_window_view(values, window)
+        total = windows[:, 0].copy()
+        for j in range(1, window):
+            total += windows[:, j]
+        out[window - 1:] = total / window
+    return out
+
+
+def rolling_std(values, window, mean):
+    # Sample standard deviation (ddof=1) reusing the already computed rolling mean
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        windows = sliding_window_view(values, window)
+        m = mean[window - 1:]
+        total = (windows[:, 0] - m) ** 2
+        for j in range(1, window):
+            total += (windows[:, j] - m) ** 2
+        out[window - 1:] = np.sqrt(total / (window - 1))
+    return out
+
+
+def ewm_mean(values, span, groups=None, seed=None):
+    series = pd.Series(values)
+    if groups is not None:
+        # Input is sorted by group, so the grouped result comes back in the same order
+        return series.groupby(groups, sort=False).ewm(span=span, adjust=False).mean().to_numpy()
+    if seed is None:
+        return series.ewm(span=span, adjust=False).mean().to_numpy()
+    # Resume from a saved state: the last EWM value followed by the missing values
+    # seen since the last observation reproduces the exact internal weights
+    value, nans = seed
+    prefix = np.r_[value, np.full(nans, np.nan)]
+    seeded = pd.Series(np.r_[prefix, values]).ewm(span=span, adjust=False).mean().to_numpy()
+    return seeded[len(prefix):]
+
+
+def compute_indicators(close, groups=None, state=None):
+    # close: float array sorted by (ticker, date); groups: matching ticker codes
+    # (None for a single ticker). With `state` (single ticker only) close holds just
+    # the new bars and the saved state supplies the history they depend on.
+    # Returns {column: array}, plus the EMA_12/EMA_26 legs needed to resume MACD.
+    close = np.asarray(close, dtype=float)
+    new_close = close
+    previous = 0
+    if state is not None:
+        buffer = np.asarray(state['buffer'], dtype=float)
+        previous = len(buffer)
+        close = np.r_[buffer, new_close]
+    if groups is None:
+        position = np.arange(len(close)) + (state['rows'] - previous if state else 0)
+    else:
+        starts = np.r_[0, np.flatnonzero(np.diff(groups)) + 1]
+        lengths = np.diff(np.r_[starts, len(close)])
+        position = np.arange(len(close)) - np.repeat(starts, lengths)
+    seeds = state['ewm'] if state else {}
+
+    def ewm(values, span, name):
+        result = ewm_mean(values[previous:], span, groups, seeds.get(name))
+        return np.r_[np.full(previous, np.nan), result]
+
+    # Simple Moving Average (SMA); SMA_20 doubles as the Bollinger middle band
+    sma_20 = rolling_mean(close, 20)
+    sma_50 = rolling_mean(close, 50)
+    std_20 = rolling_std(close, 20, sma_20)
+    sma_20[position < 19] = np.nan
+    std_20[position < 19] = np.nan
+    sma_50[position < 49] = np.nan
+    # Exponential Moving Averages (EMA_20 and the MACD legs)
+    ema_20 = ewm(close, 20, 'EMA_20')
+    ema_12 = ewm(close, 12, 'EMA_12')
+    ema_26 = ewm(close, 26, 'EMA_26')
     # Relative Strength Index (RSI)
-    delta = df['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df['RSI_14'] = 100 - (100 / (1 + rs))
+    delta = np.r_[np.nan, np.diff(close)]
+    delta[position == 0] = np.nan
+    gain = rolling_mean(np.where(delta > 0, delta, 0), 14)
+    loss = rolling_mean(-np.where(delta < 0, delta, 0), 14)
+    gain[position < 13] = np.nan
+    loss[position < 13] = np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - (100 / (1 + gain / loss))
     # MACD
-    ema_12 = df['Close'].ewm(span=12, adjust=False).mean()
-    ema_26 = df['Close'].ewm(span=26, adjust=False).mean()
-    df['MACD'] = ema_12 - ema_26
-    df['MACD_Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-    # Bollinger Bands
-    df['BB_Middle'] = df['Close'].rolling(window=20).mean()
-    df['BB_Std'] = df['Close'].rolling(window=20).std()
-    df['BB_Upper'] = df['BB_Middle'] + 2 * df['BB_Std']
-    df['BB_Lower'] = df['BB_Middle'] - 2 * df['BB_Std']
-    # Volatility (Rolling Std Dev)
-    df['Volatility_20'] = df['Close'].rolling(window=20).std()
+    macd = ema_12 - ema_26
+    macd_signal = ewm(macd, 9, 'MACD_Signal')
+
+    indicators = {
+        'SMA_20': sma_20,
+        'SMA_50': sma_50,
+        'EMA_20': ema_20,
+        'RSI_14': rsi,
+        'MACD': macd,
+        'MACD_Signal': macd_signal,
+        # Bollinger Bands
+        'BB_Middle': sma_20,
+        'BB_Std': std_20,
+        'BB_Upper': sma_20 + 2 * std_20,
+        'BB_Lower': sma_20 - 2 * std_20,
+        # Volatility (Rolling Std Dev) is the same 20-day std as the bands
+        'Volatility_20': std_20,
+        'EMA_12': ema_12,
+        'EMA_26': ema_26,
+    }
+    return {name: values[previous:] for name, values in indicators.items()}
+
+
+# --- Incremental State ---
+# Per ticker we keep everything needed to extend the indicators by new bars
+# without the full history: the last 49 closes (longest window is SMA_50), the row
+# count (to know when windows become valid) and, for every EWM, its last value
+# plus the number of missing inputs since its last observation.
+
+state_window = 49
+ewm_inputs = {'EMA_20': 'close', 'EMA_12': 'close', 'EMA_26': 'close', 'MACD_Signal': 'MACD'}
+
+
+def trailing_nans(values, previous=0):
+    observed = np.flatnonzero(~np.isnan(values))
+    if len(observed) == 0:
+        return previous + len(values)
+    return len(values) - 1 - observed[-1]
+
+
+def update_state(state, close, indicators, last_date):
+    # close/indicators hold the bars just computed (all of them for a fresh ticker)
+    close = np.asarray(close, dtype=float)
+    buffer = np.asarray(state['buffer'] if state else [], dtype=float)
+    inputs = {'close': close, 'MACD': indicators['MACD']}
+    ewm_state = {}
+    for name, source in ewm_inputs.items():
+        previous_value, previous_nans = state['ewm'][name] if state else (np.nan, 0)
+        value = indicators[name][-1] if len(close) else previous_value
+        ewm_state[name] = [float(value), int(trailing_nans(inputs[source], previous_nans))]
+    return {
+        'last_date': last_date,
+        'rows': (state['rows'] if state else 0) + len(close),
+        'buffer': np.r_[buffer, close][-state_window:].tolist(),
+        'ewm': ewm_state,
+    }
+
+
+def extend_bar(state, close, date):
+    # Indicators for one new bar of one ticker from its saved state. The work is
+    # bounded by the state window, not by the length of the history.
+    indicators = compute_indicators([close], state=state)
+    values = {name: float(indicators[name][-1]) for name in indicator_columns}
+    return values, update_state(state, [close], indicators, date)
+
+
+def add_technical_indicators(df):
+    # Single-ticker frame already sorted by date
+    indicators = compute_indicators(df['Close'].to_numpy())
+    for name in indicator_columns:
+        df[name] = indicators[name]
     return df
 
-# Apply indicators for each stock separately
-enhanced_df = []
-for ticker in df['Ticker'].unique():
-    temp = df[df['Ticker'] == ticker].copy()
-    temp = add_technical_indicators(temp)
-    enhanced_df.append(temp)
 
-df_features = pd.concat(enhanced_df)
+def sort_by_ticker_and_date(df):
+    # Tickers keep their order of first appearance; rows are only reordered
+    # (one take) when they are not already grouped and date-sorted
+    codes = pd.factorize(df['Ticker'])[0]
+    dates = pd.to_datetime(df['Date']).to_numpy()
+    order = np.lexsort((dates, codes))
+    if not np.array_equal(order, np.arange(len(df))):
+        df = df.iloc[order].reset_index(drop=True)
+        codes = codes[order]
+    return df, codes
+
+
+def build_features(df, with_state=False):
+    df, codes = sort_by_ticker_and_date(df)
+    close = df['Close'].to_numpy(dtype=float)
+    indicators = compute_indicators(close, codes)
+    for name in indicator_columns:
+        df[name] = indicators[name]
+    if not with_state:
+        return df
+    state = {}
+    starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1, len(df)]
+    for start, end in zip(starts[:-1], starts[1:]):
+        ticker = df['Ticker'].iat[start]
+        ticker_indicators = {name: values[start:end] for name, values in indicators.items()}
+        last_date = pd.Timestamp(df['Date'].iat[end - 1]).strftime('%Y-%m-%d')
+        state[ticker] = update_state(None, close[start:end], ticker_indicators, last_date)
+    return df, state
+
+
+def extend_features(df, state):
+    # Computes indicators only for rows newer than each ticker's saved state.
+    # Returns the new feature rows and the updated state.
+    df, codes = sort_by_ticker_and_date(df)
+    dates = pd.to_datetime(df['Date'])
+    new_rows = []
+    state = dict(state)
+    starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1, len(df)]
+    for start, end in zip(starts[:-1], starts[1:]):
+        ticker = df['Ticker'].iat[start]
+        ticker_state = state.get(ticker)
+        if ticker_state is not None:
+            start += int(np.searchsorted(dates.values[start:end], np.datetime64(pd.Timestamp(ticker_state['last_date'])), side='right'))
+        if start == end:
+            continue
+        rows = df.iloc[start:end].copy()
+        close = rows['Close'].to_numpy(dtype=float)
+        indicators = compute_indicators(close, state=ticker_state)
+        for name in indicator_columns:
+            rows[name] = indicators[name]
+        new_rows.append(rows)
+        last_date = pd.Timestamp(rows['Date'].iat[-1]).strftime('%Y-%m-%d')
+        state[ticker] = update_state(ticker_state, close, indicators, last_date)
+    if not new_rows:
+        return df.iloc[:0].reindex(columns=list(df.columns) + indicator_columns), state
+    return pd.concat(new_rows, ignore_index=True), state
+
+
+def load_state(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path):
+    with open(path, 'w') as f:
+        json.dump(state, f)
+
+
+def verify_features():
+    # Recomputes everything from scratch and checks the features store matches it exactly
+    expected = build_features(load_prices())
+    stored = read_store('features').astype({'Ticker': str})
+    stored = stored.sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
+    expected = expected.astype({'Ticker': str}).sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
+    if len(stored) != len(expected) or not (stored['Ticker'].values == expected['Ticker'].values).all() \
+            or not (stored['Date'].values == expected['Date'].values).all():
+        print(f'Mismatch: the features store has {len(stored)} rows, a full recompute gives {len(expected)}')
+        return False
+    ok = True
+    for name in ['Close'] + indicator_columns:
+        # The store keeps indicators as float32, so compare at that precision
+        a = stored[name].to_numpy(dtype=np.float32)
+        b = expected[name].to_numpy(dtype=np.float32)
+        if not np.array_equal(a, b, equal_nan=True):
+            bad = ~((a == b) | (np.isnan(a) & np.isnan(b)))
+            print(f'Mismatch in {name}: {bad.sum()} rows differ (max abs diff {np.nanmax(np.abs(a - b)):.3g})')
+            ok = False
+    if ok:
+        print(f'Verified: the features store matches a full recompute exactly ({len(stored)} rows)')
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute technical indicators for all stocks.')
+    parser.add_argument('--incremental', action='store_true', help='Only compute rows newer than the saved indicator state and append them')
+    parser.add_argument('--verify', action='store_true', help='Check the features store against a full recompute and exit')
+    parser.add_argument('--csv', action='store_true', help='Also export data/all_stocks_10y_features.csv (e.g. for Power BI)')
+    args = parser.parse_args()
+    state_path = 'data/store/features_state.json'
 
-# Save the enhanced dataset
-os.makedirs('data', exist_ok=True)
-df_features.to_csv('data/all_stocks_10y_features.csv', index=False)
+    if args.verify:
+        raise SystemExit(0 if verify_features() else 1)
 
-print('Feature engineering complete! Enhanced dataset saved as data/all_stocks_10y_features.csv') 
\ No newline at end of file
+    started = time.time()
+    # Load the combined stock data
+    with span('load'):
+        df = load_prices()
+    if args.incremental and os.path.exists(state_path) and store_exists('features'):
+        with span('compute', Mode='incremental'):
+            new_rows, state = extend_features(df, load_state(state_path))
+        # Append the new bars to the features store
+        with span('write_store', Rows=len(new_rows)):
+            write_store(new_rows, 'features', append=True)
+            save_state(state, state_path)
+        print(f'Incremental feature update complete! Appended {len(new_rows)} new rows to the features store')
+    else:
+        with span('compute', Mode='full'):
+            df_features, state = build_features(df, with_state=True)
+        # Save the enhanced dataset
+        with span('write_store', Rows=len(df_features)):
+            write_store(df_features, 'features')
+            save_state(state, state_path)
+        print('Feature engineering complete! Enhanced dataset saved to data/store/features')
+    if args.csv:
+        with span('export_csv'):
+            export_csv(read_store('features'), 'data/all_stocks_10y_features.csv')
+    write_run_report('features', started=started)
@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Content-addressed cache of model fits.
+# An entry is keyed by a hash of the training series, the model class, its
+# configuration (order, seasonal_order, fit mode, ...) and the fitting library's
+# version, so a (ticker, horizon, model) whose inputs have not changed is served
+# from disk instead of refit. Entries hold the fitted parameters and forecasts as
+# {horizon: {name: array}} and are stored as .npz files. When the cache grows
+# past max_bytes the least recently used entries are deleted; the size is tracked
+# as a running total so the directory is only scanned once per run and on eviction.
+
+cache_dir = 'data/cache/fits'
+default_max_bytes = 512 * 1024 * 1024
+
+
+def library_version(model):
+    if model == 'Prophet':
+        import prophet
+        return f'prophet-{prophet.__version__}'
+    import statsmodels
+    return f'statsmodels-{statsmodels.__version__}'
+
+
+def fit_key(values, model, config):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(np.asarray(values, dtype='float64')).tobytes())
+    if isinstance(values, pd.Series):
+        # Prophet depends on the dates, not just the values
+        digest.update(np.asarray(values.index.astype('datetime64[ns]')).view('int64').tobytes())
+    digest.update(json.dumps([model, config, library_version(model)], sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class FitCache:
+    def __init__(self, directory=cache_dir, max_bytes=default_max_bytes, low_water=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water = low_water  # eviction frees space down to this fraction of max_bytes
+        self.total_bytes = None  # running size of the entries, from one scan per run
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                value = {}
+                for name in data.files:
+                    horizon, field = name.split('__', 1)
+                    value.setdefault(int(horizon), {})[field] = data[name]
+            os.utime(path)  # mark as recently used for eviction
+        except FileNotFoundError:
+            # Evicted by another process in the meantime
+            self.misses += 1
+            return None
+        except (OSError, ValueError):
+            # Unreadable entry (e.g. interrupted write): treat as a miss and drop it
+            self.remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        arrays = {f'{horizon}__{field}': np.asarray(array)
+                  for horizon, fields in value.items() for field, array in fields.items()}
+        path = self.path(key)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        replaced = self.size(path)
+        os.replace(tmp_path, path)
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for _, size, _ in self.entries())
+        else:
+            self.total_bytes += self.size(path) - replaced
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def size(self, path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def remove(self, path):
+        # Entries may be deleted concurrently by another run sharing the cache
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def entries(self):
+        # [(mtime, size, name)] of the cache entries, skipping files that vanish while listing
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self):
+        # Deletes least recently used entries until the cache is below the low-water
+        # mark, so the next scan is only needed after that much new data
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes * self.low_water:
+                    break
+                if self.remove(os.path.join(self.directory, name)):
+                    self.evictions += 1
+                total -= size
+        self.total_bytes = total
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = 100 * self.hits / lookups if lookups else 0.0
+        size = sum(size for _, size, _ in self.entries())
+        print(f'\nFit cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), '
+              f'{self.evictions} evicted, {size / 1e6:.1f} MB in {self.directory}')
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import time
+import resource
+import cProfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Timing and resource instrumentation for the pipeline scripts.
+# Code is wrapped in named spans (`with span('fit', Ticker=...)`). Every span
+# records wall and CPU time, bytes read/written by the process while it was open
+# and the process' peak RSS when it closed. Spans recorded in task-runner workers
+# are shipped back with the task result, tagged with the task key, and everything
+# is written as one machine-readable run report per stage in data/run_reports/.
+
+report_dir = 'data/run_reports'
+_spans = []
+
+
+def io_counters():
+    # (bytes read, bytes written) by this process, including cached I/O; Linux only
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+@contextmanager
+def span(name, **tags):
+    start_read, start_write = io_counters()
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall_time = time.perf_counter() - start
+        read, write = io_counters()
+        _spans.append({
+            'Span': name,
+            **tags,
+            'Wall_Time_s': round(wall_time, 4),
+            'CPU_Time_s': round(time.process_time() - start_cpu, 4),
+            'Read_Bytes': read - start_read,
+            'Write_Bytes': write - start_write,
+            'Peak_RSS_MB': round(peak_rss_mb(), 1),
+        })
+
+
+def take_spans():
+    # Returns the spans recorded so far in this process and starts a new list
+    spans = list(_spans)
+    _spans.clear()
+    return spans
+
+
+def profile_path(profile_dir, key):
+    name = '_'.join(str(part) for part in key).replace('^', '').replace('/', '_')
+    return os.path.join(profile_dir, f'{name}.prof')
+
+
+def run_profiled(path, fn, *args, **kwargs):
+    # Runs fn under cProfile and dumps the stats (readable by pstats, snakeviz,
+    # flameprof, ...) to path
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profiler.dump_stats(path)
+
+
+def keep_slowest_profiles(results, profile_dir, keep):
+    # Deletes the profile dumps of all but the `keep` slowest tasks
+    ranked = sorted(results, key=lambda r: r.wall_time, reverse=True)
+    for r in ranked[keep:]:
+        path = profile_path(profile_dir, r.key)
+        if os.path.exists(path):
+            os.remove(path)
+    kept = [profile_path(profile_dir, r.key) for r in ranked[:keep] if os.path.exists(profile_path(profile_dir, r.key))]
+    if kept:
+        print(f'cProfile dumps of the {len(kept)} slowest tasks saved in {profile_dir}')
+    return kept
+
+
+def write_run_report(stage, results=(), key_names=(), started=None):
+    # Combines the spans recorded in this process with those of the task results
+    # and writes data/run_reports/{stage}_run_report.json (plus a flat .csv)
+    spans = take_spans()
+    tasks = []
+    for r in results:
+        tags = dict(zip(key_names, r.key))
+        tasks.append({**tags, 'Status': r.status, 'Wall_Time_s': round(r.wall_time, 4)})
+        spans.extend({**row, **tags} for row in getattr(r, 'spans', []))
+    report = {
+        'stage': stage,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)) if started else None,
+        'wall_time_s': round(time.time() - started, 3) if started else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'tasks': tasks,
+        'spans': spans,
+    }
+    os.makedirs(report_dir, exist_ok=True)
+    json_path = os.path.join(report_dir, f'{stage}_run_report.json')
+    with open(json_path, 'w') as f:
+        json.dump(report, f, indent=1, default=str)
+    table = pd.DataFrame(spans)
+    metrics = ['Wall_Time_s', 'CPU_Time_s', 'Read_Bytes', 'Write_Bytes', 'Peak_RSS_MB']
+    table = table[[c for c in table.columns if c not in metrics] + [c for c in metrics if c in table.columns]]
+    table.to_csv(os.path.join(report_dir, f'{stage}_run_report.csv'), index=False)
+    if len(table):
+        summary = table.groupby('Span', sort=False)[['Wall_Time_s', 'CPU_Time_s', 'Read_Bytes', 'Write_Bytes']].sum()
+        summary.insert(0, 'Count', table.groupby('Span', sort=False).size())
+        print('\nTime by span:')
+        print(summary.sort_values('Wall_Time_s', ascending=False).to_string())
+    print(f'Run report saved as {json_path}')
+    return report
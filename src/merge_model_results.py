@@ -1,23 +1,106 @@
+import argparse
 import pandas as pd
 import os
+import re
+import time
 
-forecast_horizons = [7, 30, 90, 180]
+from data_store import write_store
+from instrumentation import span, write_run_report
 
-def merge_for_ticker_and_horizon(ticker, horizon):
-    arima_prophet_path = f'data/model_outputs/{ticker}_arima_prophet_results_{horizon}.csv'
-    sarima_path = f'data/model_outputs/{ticker}_sarima_results_{horizon}.csv'
-    if not os.path.exists(arima_prophet_path) or not os.path.exists(sarima_path):
-        print(f'Skipping {ticker} ({horizon}d): missing ARIMA/Prophet or SARIMA results.')
+# Merges the per-model results files into one table per ticker.
+# The available outputs are discovered from a single listing of data/model_outputs
+# ({ticker}_{source}_results_{horizon}.csv for any source: arima_prophet, sarima,
+# lstm, ...). Each ticker is then merged on its own: every source's files are read
+# once and outer-joined on (Date, Horizon). Results are appended ticker by ticker
+# to the typed model_results store (for the dashboard) and written as the
+# {ticker}_all_models_results_{horizon}.csv files (for Power BI), so memory use
+# does not grow with the number of tickers.
+
+output_dir = 'data/model_outputs'
+results_pattern = re.compile(r'^(?P<ticker>[^_]+)_(?P<source>.+)_results_(?P<horizon>\d+)\.csv$')
+merged_source = 'all_models'
+# Known forecast columns come first in this order; others follow alphabetically
+forecast_order = ['ARIMA_Forecast', 'Prophet_Forecast', 'SARIMA_Forecast', 'LSTM_Forecast']
+
+
+def index_model_outputs(directory=output_dir):
+    # {ticker: {source: {horizon: path}}} from one directory listing
+    index = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            match = results_pattern.match(entry.name)
+            if match is None or match['source'] == merged_source:
+                continue
+            index.setdefault(match['ticker'], {}).setdefault(match['source'], {})[int(match['horizon'])] = entry.path
+    return index
+
+
+def forecast_columns(index):
+    # Union of the forecast columns of every source (one header read per source),
+    # so every ticker is written with the same schema
+    headers = {}
+    for sources in index.values():
+        for source, horizons in sources.items():
+            if source not in headers:
+                with open(next(iter(horizons.values()))) as f:
+                    headers[source] = f.readline().strip().split(',')
+    columns = {c for header in headers.values() for c in header if c.endswith('_Forecast')}
+    return sorted(columns, key=lambda c: (forecast_order.index(c) if c in forecast_order else len(forecast_order), c))
+
+
+def merge_ticker(ticker, sources, columns):
+    merged = None
+    for source in sorted(sources):
+        horizons = sources[source]
+        frame = pd.concat([pd.read_csv(path, parse_dates=['Date']).assign(Horizon=horizon)
+                           for horizon, path in sorted(horizons.items())], ignore_index=True)
+        if merged is None:
+            merged = frame
+            continue
+        merged = merged.merge(frame, on=['Date', 'Horizon'], how='outer', suffixes=('', '_other'))
+        # Columns present in several sources (at least Actual): keep the first non-missing value
+        for column in [c for c in merged.columns if c.endswith('_other')]:
+            merged[column[:-len('_other')]] = merged[column[:-len('_other')]].combine_first(merged.pop(column))
+    merged = merged.reindex(columns=['Date', 'Horizon', 'Actual'] + columns)
+    merged.insert(0, 'Ticker', ticker)
+    merged['Horizon'] = merged['Horizon'].astype('int32')
+    return merged.sort_values(['Horizon', 'Date'], kind='stable').reset_index(drop=True)
+
+
+def write_merged_csvs(ticker, merged, directory=output_dir):
+    for horizon, rows in merged.groupby('Horizon'):
+        rows.to_csv(os.path.join(directory, f'{ticker}_all_models_results_{horizon}.csv'), index=False,
+                    date_format='%Y-%m-%d')
+
+
+def merge_model_results(directory=output_dir, write_csv=True):
+    started = time.time()
+    with span('index'):
+        index = index_model_outputs(directory)
+        columns = forecast_columns(index)
+    if not index:
+        print(f'No model results found in {directory}.')
         return
-    arima_prophet = pd.read_csv(arima_prophet_path)
-    sarima = pd.read_csv(sarima_path)
-    merged = arima_prophet.merge(sarima[['Date', 'SARIMA_Forecast']], on='Date', how='left')
-    merged.to_csv(f'data/model_outputs/{ticker}_all_models_results_{horizon}.csv', index=False)
-    print(f'Merged model results saved as data/model_outputs/{ticker}_all_models_results_{horizon}.csv')
-
-# Get all tickers from features file
-features = pd.read_csv('data/all_stocks_10y_features.csv')
-tickers = features['Ticker'].unique()
-for ticker in tickers:
-    for horizon in forecast_horizons:
-        merge_for_ticker_and_horizon(ticker, horizon) 
\ No newline at end of file
+    print(f'Merging {", ".join(columns)} for {len(index)} tickers...')
+    for i, ticker in enumerate(sorted(index)):
+        sources = index[ticker]
+        with span('merge', Ticker=ticker):
+            merged = merge_ticker(ticker, sources, columns)
+        with span('write_store', Ticker=ticker):
+            write_store(merged, 'model_results', append=i > 0)
+        if write_csv:
+            with span('write_csv', Ticker=ticker):
+                write_merged_csvs(ticker, merged, directory)
+        print(f'  {ticker}: merged {", ".join(sorted(sources))} for horizons '
+              f'{", ".join(str(h) for h in sorted(merged["Horizon"].unique()))}')
+    print('Merged model results saved to data/store/model_results')
+    if write_csv:
+        print(f'Merged CSVs saved as {directory}/{{ticker}}_all_models_results_{{horizon}}.csv')
+    write_run_report('merge', started=started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Merge the results of every model into one table per ticker.')
+    parser.add_argument('--no-csv', action='store_true', help='Only write the model_results store, not the per-horizon CSVs')
+    args = parser.parse_args()
+    merge_model_results(write_csv=not args.no_csv)
@@ -1,67 +1,368 @@
+import argparse
+import hashlib
+import logging
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import os
+import time
 from statsmodels.tsa.arima.model import ARIMA
 from prophet import Prophet
 
-# Load the enhanced dataset
-df = pd.read_csv('data/all_stocks_10y_features.csv')
-tickers = df['Ticker'].unique()
+from task_runner import Task, run_tasks, print_timing_report, default_workers
+from model_utils import load_close_series, roll_forward_forecasts, run_cached_tasks, compare_fit_modes, fit_modes
+from fit_cache import FitCache, fit_key, default_max_bytes
+from batch_arima import batched_arima_forecasts
+from instrumentation import span, write_run_report, keep_slowest_profiles, report_dir
+from render_plots import render_plots
+from order_search import select_orders
+
 forecast_horizons = [7, 30, 90, 180]
+arima_order = (5, 1, 0)
+models = ['ARIMA', 'Prophet']
+arima_engines = ['statsmodels', 'batched']
+# standard: the original Prophet setup; fast: no daily seasonality (the data is
+# daily), no uncertainty sampling, predict only the forecast rows, quiet
+# cmdstanpy, and warm starts from the ticker's previous fit (saved across runs)
+prophet_modes = ['standard', 'fast']
+prophet_init_dir = 'data/cache/prophet_init'
+
+
+def forecast_arima(train, steps, order=arima_order):
+    # Fit on the raw values: the business-day Date index has no frequency, which
+    # newer statsmodels versions refuse to forecast from
+    with span('fit'):
+        model_arima = ARIMA(np.asarray(train), order=order)
+        model_arima_fit = model_arima.fit()
+    with span('forecast'):
+        forecast = np.asarray(model_arima_fit.forecast(steps=steps))
+    return {steps: {'forecast': forecast, 'params': np.asarray(model_arima_fit.params)}}
+
 
-for ticker in tickers:
-    print(f'Processing {ticker}...')
-    df_stock = df[df['Ticker'] == ticker][['Date', 'Close']].copy()
-    df_stock['Date'] = pd.to_datetime(df_stock['Date'])
-    df_stock = df_stock.sort_values('Date')
-    df_stock.set_index('Date', inplace=True)
-
-    for horizon in forecast_horizons:
-        print(f'  Forecast horizon: {horizon} days')
-        # Split into train/test (last {horizon} days for test)
-        train = df_stock.iloc[:-horizon]
-        test = df_stock.iloc[-horizon:]
-
-        # --- ARIMA Model ---
-        print(f'    Training ARIMA model for {ticker}...')
-        model_arima = ARIMA(train['Close'], order=(5,1,0))
+def forecast_arima_shared(close, horizons, order=arima_order):
+    # Fit once on the shortest training window and reuse it for every horizon
+    values = np.asarray(close)
+    with span('fit'):
+        model_arima = ARIMA(values[:-max(horizons)], order=order)
         model_arima_fit = model_arima.fit()
-        forecast_arima = model_arima_fit.forecast(steps=len(test))
-
-        # --- Prophet Model ---
-        print(f'    Training Prophet model for {ticker}...')
-        df_prophet = train.reset_index().rename(columns={'Date': 'ds', 'Close': 'y'})
-        model_prophet = Prophet(daily_seasonality=True)
-        model_prophet.fit(df_prophet)
-        future = model_prophet.make_future_dataframe(periods=len(test))
+    return roll_forward_forecasts(model_arima_fit, values, horizons)
+
+
+def quiet_prophet_logging():
+    # cmdstanpy sets its logger to DEBUG the first time it is used, so it is set up
+    # here first; a level set before that would be overwritten on the first fit
+    from cmdstanpy.utils import get_logger
+    get_logger().setLevel(logging.WARNING)
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+
+
+def fit_prophet(train, steps, init=None, fast=False):
+    df_prophet = train.reset_index().rename(columns={'Date': 'ds', 'Close': 'y'})
+    if fast:
+        quiet_prophet_logging()
+        model_prophet_kwargs = {'daily_seasonality': False, 'uncertainty_samples': 0}
+    else:
+        model_prophet_kwargs = {'daily_seasonality': True}
+    model_prophet = Prophet(**model_prophet_kwargs)
+    warm_start = False
+    with span('fit', Forecast_Horizon=steps):
+        if init is not None:
+            # A stale warm start (saved before a seasonality/changepoint change, so
+            # delta/beta no longer fit the model) either raises or is not used by
+            # Stan; either way the ticker is fitted cold and the caller saves this
+            # fit's parameters over the stale init
+            try:
+                model_prophet.fit(df_prophet, init=init)
+                warm_start = init_matches(init, model_prophet.params)
+                if not warm_start:
+                    print('    Prophet warm start does not match the model; fitting cold')
+            except Exception as e:
+                print(f'    Prophet warm start failed ({type(e).__name__}: {e}); fitting cold')
+            if not warm_start:
+                model_prophet = Prophet(**model_prophet_kwargs)
+        if not warm_start:
+            model_prophet.fit(df_prophet)
+    with span('forecast', Forecast_Horizon=steps):
+        # Fast mode predicts only the forecast rows: the same dates as the standard
+        # path's last `steps` rows, without the history in front of them
+        future = model_prophet.make_future_dataframe(periods=steps, include_history=not fast)
         forecast_prophet = model_prophet.predict(future)
+    fitted = {'forecast': forecast_prophet['yhat'].values[-steps:], 'warm_start': np.asarray(warm_start)}
+    fitted.update({f'param_{name}': np.asarray(value) for name, value in model_prophet.params.items()})
+    return fitted, model_prophet
+
+
+def init_matches(init, params):
+    return all(np.size(init[name]) == np.size(np.asarray(params[name])[0]) for name in init)
+
+
+def forecast_prophet(train, steps, init=None, fast=False):
+    return {steps: fit_prophet(train, steps, init=init, fast=fast)[0]}
+
+
+def prophet_warm_start_params(params):
+    # Fitted parameters (model.params or the param_* arrays of a fit) in the form
+    # Prophet.fit(init=...) expects
+    params = {name[len('param_'):] if name.startswith('param_') else name: value for name, value in params.items()}
+    init = {name: float(np.asarray(params[name])[0][0]) for name in ['k', 'm', 'sigma_obs']}
+    init.update({name: np.asarray(params[name])[0] for name in ['delta', 'beta']})
+    return init
+
+
+def forecast_prophet_shared(close, horizons, init=None, fast=False):
+    # Prophet has no state to roll forward, so each longer training window is
+    # warm-started from the previous window's optimum instead of fitted cold
+    forecasts = {}
+    for horizon in sorted(horizons, reverse=True):
+        forecasts[horizon], model_prophet = fit_prophet(close.iloc[:-horizon], horizon, init=init, fast=fast)
+        init = prophet_warm_start_params(model_prophet.params)
+    # The saved init is only trusted when every fit in the chain warm-started from it
+    warm_start = all(bool(fitted['warm_start']) for fitted in forecasts.values())
+    forecasts[min(horizons)]['warm_start'] = np.asarray(warm_start)
+    return forecasts
+
+
+def load_prophet_init(ticker):
+    path = os.path.join(prophet_init_dir, f'{ticker}.npz')
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            return prophet_warm_start_params({name: data[name] for name in data.files})
+    except (OSError, ValueError, KeyError, IndexError):
+        return None  # unreadable init: fit cold, the next save replaces it
+
 
-        # --- Plotting ---
-        plt.figure(figsize=(14, 7))
-        plt.plot(train.index, train['Close'], label='Train', color='blue')
-        plt.plot(test.index, test['Close'], label='Test', color='black')
-        plt.plot(test.index, forecast_arima, label='ARIMA Forecast', color='red', linestyle='--')
-        plt.plot(forecast_prophet['ds'], forecast_prophet['yhat'], label='Prophet Forecast', color='green', linestyle='--', alpha=0.7)
-        plt.title(f'{ticker} Close Price Forecast (ARIMA & Prophet, {horizon} days)')
-        plt.xlabel('Date')
-        plt.ylabel('Close Price')
-        plt.legend()
-        plt.tight_layout()
-        os.makedirs('data/model_outputs', exist_ok=True)
-        plt.savefig(f'data/model_outputs/{ticker}_arima_prophet_forecast_{horizon}.png')
-        plt.close()
-
-        # --- Save Results for Power BI/Streamlit ---
+def init_digest(init):
+    # Part of the fit cache key: a warm start can move Prophet to a different
+    # optimum, so fits from different inits are different cache entries
+    if init is None:
+        return None
+    digest = hashlib.sha256()
+    for name in sorted(init):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(np.asarray(init[name], dtype='float64')).tobytes())
+    return digest.hexdigest()
+
+
+def saved_init_data_key(ticker):
+    # fit_key of the training series the saved init was fitted on
+    path = os.path.join(prophet_init_dir, f'{ticker}.npz')
+    try:
+        with np.load(path) as data:
+            return str(data['data_key']) if 'data_key' in data.files else None
+    except (OSError, ValueError):
+        return None
+
+
+def save_prophet_init(ticker, fitted, data_key):
+    os.makedirs(prophet_init_dir, exist_ok=True)
+    np.savez(os.path.join(prophet_init_dir, f'{ticker}.npz'), data_key=np.asarray(data_key),
+             **{name: value for name, value in fitted.items() if name.startswith('param_')})
+
+
+forecast_functions = {
+    'refit': {'ARIMA': forecast_arima, 'Prophet': forecast_prophet},
+    'shared': {'ARIMA': forecast_arima_shared, 'Prophet': forecast_prophet_shared},
+}
+
+
+def save_results(ticker, horizon, close, forecast_arima, forecast_prophet):
+    test = close.iloc[-horizon:]
+
+    # --- Save Results for Power BI/Streamlit ---
+    # (forecast plots are rendered from these files by src/render_plots.py)
+    os.makedirs('data/model_outputs', exist_ok=True)
+    with span('write_csv', Ticker=ticker, Horizon=horizon, Model='ARIMA+Prophet'):
         results = pd.DataFrame({
             'Date': test.index,
-            'Actual': test['Close'].values,
-            'ARIMA_Forecast': forecast_arima.values,
-            'Prophet_Forecast': forecast_prophet.iloc[-len(test):]['yhat'].values
+            'Actual': test.values,
+            'ARIMA_Forecast': forecast_arima['forecast'],
+            'Prophet_Forecast': forecast_prophet['forecast']
         })
         results.to_csv(f'data/model_outputs/{ticker}_arima_prophet_results_{horizon}.csv', index=False)
-        print(f'    Results saved as data/model_outputs/{ticker}_arima_prophet_results_{horizon}.csv')
+    print(f'    Results saved as data/model_outputs/{ticker}_arima_prophet_results_{horizon}.csv')
+
+
+def build_tasks(series, fit_mode, task_models=models, orders=None, prophet_mode='standard'):
+    # orders: {ticker: (order, seasonal_order)} for ARIMA from src/order_search.py;
+    # tickers without one use arima_order
+    tasks = []
+    for ticker, close in series.items():
+        for model in task_models:
+            forecast_fn = forecast_functions[fit_mode][model]
+            kwargs = {'order': orders[ticker][0]} if model == 'ARIMA' and orders and ticker in orders else {}
+            if model == 'Prophet' and prophet_mode == 'fast':
+                kwargs = {'init': load_prophet_init(ticker), 'fast': True}
+            if fit_mode == 'shared':
+                tasks.append(Task((ticker, 'all', model, fit_mode), forecast_fn, (close, forecast_horizons), kwargs))
+                continue
+            for horizon in forecast_horizons:
+                # Split into train/test (last {horizon} days for test)
+                train = close.iloc[:-horizon]
+                tasks.append(Task((ticker, horizon, model, fit_mode), forecast_fn, (train, horizon), kwargs))
+    return tasks
+
+
+def cache_key(task):
+    ticker, horizon, model, fit_mode = task.key
+    config = {'fit_mode': fit_mode, 'horizons': forecast_horizons if fit_mode == 'shared' else [horizon]}
+    if model == 'ARIMA':
+        config['order'] = task.kwargs.get('order', arima_order)
+    elif task.kwargs.get('fast'):
+        config.update({'daily_seasonality': False, 'uncertainty_samples': 0, 'future': 'forecast_only',
+                       'init': init_digest(task.kwargs.get('init'))})
+    else:
+        config['daily_seasonality'] = True
+    return fit_key(task.args[0], model, config)
+
+
+def compare_prophet_modes(series, fit_mode, workers=None, timeout=None,
+                          report_path='data/run_reports/prophet_mode_comparison.csv'):
+    # Runs Prophet in both modes (without the fit cache, so both are timed) and
+    # reports the fast mode's speedup and accuracy change against the standard one
+    tasks = []
+    for mode in prophet_modes:
+        for task in build_tasks(series, fit_mode, ['Prophet'], prophet_mode=mode):
+            tasks.append(Task(task.key[:3] + (mode,), task.fn, task.args, task.kwargs))
+    print(f'Comparing Prophet modes for {len(series)} tickers x {len(forecast_horizons)} horizons ({fit_mode})...')
+    results = run_tasks(tasks, workers=workers, timeout=timeout)
+    forecasts = {}
+    for r in results:
+        if r.status != 'ok':
+            print(f'  Prophet ({r.key[3]}) failed for {r.key[0]} ({r.key[1]}d): {r.status}')
+            continue
+        for horizon, fitted in r.value.items():
+            forecasts[(r.key[0], horizon, r.key[3])] = fitted['forecast']
+    wall_times = {mode: sum(r.wall_time for r in results if r.key[3] == mode) for mode in prophet_modes}
+    rows = []
+    for ticker in series:
+        for horizon in forecast_horizons:
+            if (ticker, horizon, 'standard') not in forecasts or (ticker, horizon, 'fast') not in forecasts:
+                continue
+            actual = series[ticker].values[-horizon:]
+            rows.append({
+                'Ticker': ticker,
+                'Horizon': horizon,
+                'Standard_MAE': np.nanmean(np.abs(actual - forecasts[(ticker, horizon, 'standard')])),
+                'Fast_MAE': np.nanmean(np.abs(actual - forecasts[(ticker, horizon, 'fast')])),
+            })
+    comparison = pd.DataFrame(rows, columns=['Ticker', 'Horizon', 'Standard_MAE', 'Fast_MAE'])
+    comparison['MAE_Change'] = comparison['Fast_MAE'] - comparison['Standard_MAE']
+    print('\nProphet mode comparison (fast vs standard):')
+    print(comparison.to_string(index=False))
+    print(f"Mean MAE: standard {comparison['Standard_MAE'].mean():.3f}, fast {comparison['Fast_MAE'].mean():.3f}")
+    speedup = wall_times['standard'] / wall_times['fast'] if wall_times['fast'] else float('nan')
+    print(f"Total Prophet time: standard {wall_times['standard']:.1f}s, fast {wall_times['fast']:.1f}s ({speedup:.1f}x faster)")
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    comparison.to_csv(report_path, index=False)
+    print(f'Comparison saved as {report_path}')
+    return comparison, results
+
+
+def main(workers=None, timeout=None, fit_mode='refit', compare=False, use_cache=True, cache_max_bytes=default_max_bytes,
+         arima_engine='statsmodels', profile=0, plots=True, auto_order=False, force_search=False,
+         prophet_mode='standard', compare_prophet=False):
+    started = time.time()
+    with span('load'):
+        series = load_close_series()
+    if compare_prophet:
+        with span('prophet_comparison'):
+            results = compare_prophet_modes(series, fit_mode, workers, timeout)[1]
+        write_run_report('prophet_mode_comparison', results, ['Ticker', 'Horizon', 'Model', 'Prophet_Mode'], started)
+        return
+    orders = None
+    if auto_order:
+        with span('order_search'):
+            orders = select_orders(series, 'ARIMA', workers=workers, force=force_search)[0]
+    modes = fit_modes if compare else [fit_mode]
+    forecasts = {mode: {} for mode in modes}
+    cache = FitCache(max_bytes=cache_max_bytes) if use_cache else None
+    # ARIMA and Prophet share one results file per (ticker, horizon), so it is
+    # written once both fits for that pair have finished successfully
+    finished = {}
+
+    def on_value(key, value):
+        ticker, _, model, mode = key
+        for horizon, fitted in value.items():
+            forecasts[mode][(ticker, horizon, model)] = fitted['forecast']
+            # Only the selected fit mode writes results; the other one is for comparison
+            if mode != fit_mode:
+                continue
+            if model == 'Prophet' and prophet_mode == 'fast' and horizon == min(forecast_horizons):
+                # Longest training window: the next run warm-starts from this fit.
+                # The init is part of the cache key, so it is only replaced when the
+                # data changed or the warm start was not used (missing or stale init);
+                # rewriting it on every run would make every fast fit a cache miss
+                data_key = fit_key(series[ticker].iloc[:-horizon], 'Prophet', {})
+                if not bool(fitted.get('warm_start', False)) or saved_init_data_key(ticker) != data_key:
+                    save_prophet_init(ticker, fitted, data_key)
+            done = finished.setdefault((ticker, horizon), {})
+            done[model] = fitted
+            if len(done) == len(models):
+                save_results(ticker, horizon, series[ticker], done['ARIMA'], done['Prophet'])
+
+    print(f'Training ARIMA and Prophet models for {len(series)} tickers x {len(forecast_horizons)} horizons ({", ".join(modes)})...')
+    task_models = models
+    if arima_engine == 'batched':
+        # All tickers' ARIMA fits are one vectorized problem, solved here in the
+        # parent; only Prophet goes to the worker pool
+        task_models = ['Prophet']
+        for mode in modes:
+            start = time.perf_counter()
+            with span('batched_arima', Fit_Mode=mode):
+                batched = batched_arima_forecasts(series, forecast_horizons, arima_order, mode)
+            print(f'  ARIMA ({mode}) for all {len(series)} tickers fitted by the batched engine in {time.perf_counter() - start:.2f}s')
+            for ticker, value in batched.items():
+                on_value((ticker, 'all', 'ARIMA', mode), value)
+    tasks = [task for mode in modes for task in build_tasks(series, mode, task_models, orders, prophet_mode)]
+    profile_dir = f'{report_dir}/profiles/arima_prophet' if profile else None
+    with span('tasks'):
+        results = run_cached_tasks(tasks, cache, cache_key, on_value, workers=workers, timeout=timeout, profile_dir=profile_dir)
+    print_timing_report(results, ['Ticker', 'Horizon', 'Model', 'Fit_Mode'], 'data/run_reports/arima_prophet_task_timings.csv')
+    if profile:
+        keep_slowest_profiles(results, profile_dir, profile)
+    for ticker in series:
+        for horizon in forecast_horizons:
+            if len(finished.get((ticker, horizon), {})) < len(models):
+                print(f'Skipped results for {ticker} ({horizon}d): not all models succeeded')
+    if compare:
+        compare_fit_modes(series, forecasts, results, 'data/run_reports/arima_prophet_fit_mode_comparison.csv')
+    write_run_report('arima_prophet', results, ['Ticker', 'Horizon', 'Model', 'Fit_Mode'], started)
+    print('ARIMA and Prophet modeling complete!')
+    print('Results saved as data/model_outputs/{ticker}_arima_prophet_results_*.csv')
+    if plots:
+        render_plots(['arima_prophet'], series=series, workers=workers)
+        print('Forecast plots saved as data/model_outputs/{ticker}_arima_prophet_forecast_*.png')
+
 
-    print(f'ARIMA and Prophet modeling complete for {ticker}!')
-    print(f'Forecast plot saved as data/model_outputs/{ticker}_arima_prophet_forecast_{horizon}.png')
-    print(f'Results saved as data/model_outputs/{ticker}_arima_prophet_results_{horizon}.csv') 
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit ARIMA and Prophet models for every ticker and forecast horizon.')
+    parser.add_argument('--workers', type=int, default=default_workers(), help='Number of worker processes')
+    parser.add_argument('--timeout', type=float, default=1800, help='Per-task timeout in seconds')
+    parser.add_argument('--fit-mode', choices=fit_modes, default='refit',
+                        help='refit: fit every horizon from scratch; shared: fit once per ticker and reuse it across horizons')
+    parser.add_argument('--compare-fit-modes', action='store_true', help='Run both fit modes and report their accuracy difference')
+    parser.add_argument('--no-cache', action='store_true', help='Refit everything instead of serving unchanged fits from data/cache/fits')
+    parser.add_argument('--cache-max-mb', type=float, default=default_max_bytes / 2**20, help='Fit cache size limit in MB')
+    parser.add_argument('--arima-engine', choices=arima_engines, default='statsmodels',
+                        help='statsmodels: one exact-likelihood fit per task; batched: fit every ticker at once with NumPy '
+                             '(conditional least squares, check with src/batch_arima.py)')
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help='Run fits under cProfile and keep the dumps of the N slowest tasks in data/run_reports/profiles/')
+    parser.add_argument('--no-plots', action='store_true', help='Only fit and write results; render plots later with src/render_plots.py')
+    parser.add_argument('--auto-order', action='store_true',
+                        help=f'Use per-ticker ARIMA orders chosen by src/order_search.py (searched when missing or drifted) '
+                             f'instead of {arima_order}')
+    parser.add_argument('--force-search', action='store_true', help='With --auto-order, search again for every ticker')
+    parser.add_argument('--prophet-mode', choices=prophet_modes, default='standard',
+                        help='fast: no daily seasonality or uncertainty sampling, predict only the forecast days, '
+                             'warm-start from the previous fit of each ticker')
+    parser.add_argument('--compare-prophet-modes', action='store_true',
+                        help='Only fit Prophet in both modes and report the speedup and accuracy difference')
+    args = parser.parse_args()
+    if args.auto_order and args.arima_engine == 'batched':
+        parser.error('--auto-order needs --arima-engine statsmodels (the batched engine fits one ARIMA(p, d, 0) order for all tickers)')
+    main(workers=args.workers, timeout=args.timeout, fit_mode=args.fit_mode, compare=args.compare_fit_modes,
+         use_cache=not args.no_cache, cache_max_bytes=int(args.cache_max_mb * 2**20), arima_engine=args.arima_engine,
+         profile=args.profile, plots=not args.no_plots, auto_order=args.auto_order, force_search=args.force_search,
+         prophet_mode=args.prophet_mode, compare_prophet=args.compare_prophet_modes)
@@ -1,56 +1,143 @@
+import argparse
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import os
+import time
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 
-# Load the enhanced dataset
-df = pd.read_csv('data/all_stocks_10y_features.csv')
-tickers = df['Ticker'].unique()
+from task_runner import Task, print_timing_report, default_workers
+from model_utils import load_close_series, roll_forward_forecasts, run_cached_tasks, compare_fit_modes, fit_modes
+from fit_cache import FitCache, fit_key, default_max_bytes
+from instrumentation import span, write_run_report, keep_slowest_profiles, report_dir
+from render_plots import render_plots
+from order_search import select_orders
+
 forecast_horizons = [7, 30, 90, 180]
+sarima_order = (2, 1, 2)
+sarima_seasonal_order = (1, 1, 1, 5)
+
+
+def forecast_sarima(train, steps, order=sarima_order, seasonal_order=sarima_seasonal_order):
+    # Fit on the raw values: the business-day Date index has no frequency, which
+    # newer statsmodels versions refuse to forecast from
+    with span('fit'):
+        model_sarima = SARIMAX(np.asarray(train), order=order, seasonal_order=seasonal_order)
+        model_sarima_fit = model_sarima.fit(disp=False)
+    with span('forecast'):
+        forecast = np.asarray(model_sarima_fit.forecast(steps=steps))
+    return {steps: {'forecast': forecast, 'params': np.asarray(model_sarima_fit.params)}}
+
 
-for ticker in tickers:
-    print(f'Processing {ticker}...')
-    df_stock = df[df['Ticker'] == ticker][['Date', 'Close']].copy()
-    df_stock['Date'] = pd.to_datetime(df_stock['Date'])
-    df_stock = df_stock.sort_values('Date')
-    df_stock.set_index('Date', inplace=True)
-
-    for horizon in forecast_horizons:
-        print(f'  Forecast horizon: {horizon} days')
-        # Split into train/test (last {horizon} days for test)
-        train = df_stock.iloc[:-horizon]
-        test = df_stock.iloc[-horizon:]
-
-        # --- SARIMA Model ---
-        print(f'    Training SARIMA model for {ticker}...')
-        model_sarima = SARIMAX(train['Close'], order=(2,1,2), seasonal_order=(1,1,1,5))
+def forecast_sarima_shared(close, horizons, order=sarima_order, seasonal_order=sarima_seasonal_order):
+    # Fit once on the shortest training window and reuse it for every horizon
+    values = np.asarray(close)
+    with span('fit'):
+        model_sarima = SARIMAX(values[:-max(horizons)], order=order, seasonal_order=seasonal_order)
         model_sarima_fit = model_sarima.fit(disp=False)
-        forecast_sarima = model_sarima_fit.forecast(steps=len(test))
-
-        # --- Plotting ---
-        plt.figure(figsize=(14, 7))
-        plt.plot(train.index, train['Close'], label='Train', color='blue')
-        plt.plot(test.index, test['Close'], label='Test', color='black')
-        plt.plot(test.index, forecast_sarima, label='SARIMA Forecast', color='magenta', linestyle='--')
-        plt.title(f'{ticker} Close Price Forecast (SARIMA, {horizon} days)')
-        plt.xlabel('Date')
-        plt.ylabel('Close Price')
-        plt.legend()
-        plt.tight_layout()
-        os.makedirs('data/model_outputs', exist_ok=True)
-        plt.savefig(f'data/model_outputs/{ticker}_sarima_forecast_{horizon}.png')
-        plt.close()
-
-        # --- Save Results for Power BI/Streamlit ---
+    return roll_forward_forecasts(model_sarima_fit, values, horizons)
+
+
+def save_results(ticker, horizon, close, forecast_sarima):
+    test = close.iloc[-horizon:]
+
+    # --- Save Results for Power BI/Streamlit ---
+    # (forecast plots are rendered from these files by src/render_plots.py)
+    os.makedirs('data/model_outputs', exist_ok=True)
+    with span('write_csv', Ticker=ticker, Horizon=horizon, Model='SARIMA'):
         results = pd.DataFrame({
             'Date': test.index,
-            'Actual': test['Close'].values,
-            'SARIMA_Forecast': forecast_sarima.values
+            'Actual': test.values,
+            'SARIMA_Forecast': forecast_sarima
         })
         results.to_csv(f'data/model_outputs/{ticker}_sarima_results_{horizon}.csv', index=False)
-        print(f'    Results saved as data/model_outputs/{ticker}_sarima_results_{horizon}.csv')
+    print(f'    Results saved as data/model_outputs/{ticker}_sarima_results_{horizon}.csv')
+
+
+def build_tasks(series, fit_mode, orders=None):
+    # orders: {ticker: (order, seasonal_order)} from src/order_search.py; tickers
+    # without one use the default orders
+    tasks = []
+    for ticker, close in series.items():
+        kwargs = {}
+        if orders and ticker in orders:
+            kwargs = {'order': orders[ticker][0], 'seasonal_order': orders[ticker][1]}
+        if fit_mode == 'shared':
+            tasks.append(Task((ticker, 'all', 'SARIMA', fit_mode), forecast_sarima_shared, (close, forecast_horizons), kwargs))
+            continue
+        for horizon in forecast_horizons:
+            # Split into train/test (last {horizon} days for test)
+            train = close.iloc[:-horizon]
+            tasks.append(Task((ticker, horizon, 'SARIMA', fit_mode), forecast_sarima, (train, horizon), kwargs))
+    return tasks
+
+
+def cache_key(task):
+    ticker, horizon, model, fit_mode = task.key
+    config = {
+        'order': task.kwargs.get('order', sarima_order),
+        'seasonal_order': task.kwargs.get('seasonal_order', sarima_seasonal_order),
+        'fit_mode': fit_mode,
+        'horizons': forecast_horizons if fit_mode == 'shared' else [horizon],
+    }
+    return fit_key(task.args[0], model, config)
+
+
+def main(workers=None, timeout=None, fit_mode='refit', compare=False, use_cache=True, cache_max_bytes=default_max_bytes,
+         profile=0, plots=True, auto_order=False, force_search=False):
+    started = time.time()
+    with span('load'):
+        series = load_close_series()
+    orders = None
+    if auto_order:
+        with span('order_search'):
+            orders = select_orders(series, 'SARIMA', workers=workers, force=force_search)[0]
+    modes = fit_modes if compare else [fit_mode]
+    forecasts = {mode: {} for mode in modes}
+    cache = FitCache(max_bytes=cache_max_bytes) if use_cache else None
+
+    def on_value(key, value):
+        ticker, _, model, mode = key
+        for horizon, fitted in value.items():
+            forecasts[mode][(ticker, horizon, model)] = fitted['forecast']
+            # Only the selected fit mode writes results; the other one is for comparison
+            if mode == fit_mode:
+                save_results(ticker, horizon, series[ticker], fitted['forecast'])
+
+    print(f'Training SARIMA models for {len(series)} tickers x {len(forecast_horizons)} horizons ({", ".join(modes)})...')
+    tasks = [task for mode in modes for task in build_tasks(series, mode, orders)]
+    profile_dir = f'{report_dir}/profiles/sarima' if profile else None
+    with span('tasks'):
+        results = run_cached_tasks(tasks, cache, cache_key, on_value, workers=workers, timeout=timeout, profile_dir=profile_dir)
+    print_timing_report(results, ['Ticker', 'Horizon', 'Model', 'Fit_Mode'], 'data/run_reports/sarima_task_timings.csv')
+    if profile:
+        keep_slowest_profiles(results, profile_dir, profile)
+    if compare:
+        compare_fit_modes(series, forecasts, results, 'data/run_reports/sarima_fit_mode_comparison.csv')
+    write_run_report('sarima', results, ['Ticker', 'Horizon', 'Model', 'Fit_Mode'], started)
+    print('SARIMA modeling complete!')
+    print('Results saved as data/model_outputs/{ticker}_sarima_results_*.csv')
+    if plots:
+        render_plots(['sarima'], series=series, workers=workers)
+        print('Forecast plots saved as data/model_outputs/{ticker}_sarima_forecast_*.png')
+
 
-    print(f'SARIMA modeling complete for {ticker}!')
-    print(f'Forecast plots saved as data/model_outputs/{ticker}_sarima_forecast_*.png')
-    print(f'Results saved as data/model_outputs/{ticker}_sarima_results_*.csv') 
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit SARIMA models for every ticker and forecast horizon.')
+    parser.add_argument('--workers', type=int, default=default_workers(), help='Number of worker processes')
+    parser.add_argument('--timeout', type=float, default=1800, help='Per-task timeout in seconds')
+    parser.add_argument('--fit-mode', choices=fit_modes, default='refit',
+                        help='refit: fit every horizon from scratch; shared: fit once per ticker and reuse it across horizons')
+    parser.add_argument('--compare-fit-modes', action='store_true', help='Run both fit modes and report their accuracy difference')
+    parser.add_argument('--no-cache', action='store_true', help='Refit everything instead of serving unchanged fits from data/cache/fits')
+    parser.add_argument('--cache-max-mb', type=float, default=default_max_bytes / 2**20, help='Fit cache size limit in MB')
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help='Run fits under cProfile and keep the dumps of the N slowest tasks in data/run_reports/profiles/')
+    parser.add_argument('--no-plots', action='store_true', help='Only fit and write results; render plots later with src/render_plots.py')
+    parser.add_argument('--auto-order', action='store_true',
+                        help=f'Use per-ticker orders chosen by src/order_search.py (searched when missing or drifted) '
+                             f'instead of {sarima_order}{sarima_seasonal_order}')
+    parser.add_argument('--force-search', action='store_true', help='With --auto-order, search again for every ticker')
+    args = parser.parse_args()
+    main(workers=args.workers, timeout=args.timeout, fit_mode=args.fit_mode, compare=args.compare_fit_modes,
+         use_cache=not args.no_cache, cache_max_bytes=int(args.cache_max_mb * 2**20), profile=args.profile,
+         plots=not args.no_plots, auto_order=args.auto_order, force_search=args.force_search)
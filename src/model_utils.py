@@ -0,0 +1,101 @@
+import os
+import numpy as np
+import pandas as pd
+
+from data_store import read_store
+from task_runner import run_tasks
+from instrumentation import span
+
+# Helpers shared by the modeling scripts
+
+fit_modes = ['refit', 'shared']
+
+
+def load_close_series(tickers=None):
+    # Read only Date/Close (for the requested tickers) from the features store and
+    # split it into one sorted float64 Close series per ticker
+    df = read_store('features', columns=['Date', 'Close'], tickers=tickers)
+    series = {}
+    for ticker, df_stock in df.groupby('Ticker', sort=False, observed=True):
+        series[ticker] = df_stock.set_index('Date')['Close'].astype('float64')
+    return series
+
+
+def roll_forward_forecasts(fit, values, horizons):
+    # `fit` is a statsmodels state-space result fitted on values[:-max(horizons)].
+    # Instead of refitting for every horizon, extend the fitted state with the
+    # extra observations of each longer training window (parameters held fixed)
+    # and forecast from there.
+    values = np.asarray(values)
+    end = len(values) - max(horizons)
+    params = np.asarray(fit.params)
+    forecasts = {}
+    for horizon in sorted(horizons, reverse=True):
+        new_end = len(values) - horizon
+        with span('forecast', Forecast_Horizon=horizon):
+            if new_end > end:
+                fit = fit.extend(values[end:new_end])
+                end = new_end
+            forecasts[horizon] = {'forecast': np.asarray(fit.forecast(steps=horizon)), 'params': params}
+    return forecasts
+
+
+def run_cached_tasks(tasks, cache, cache_key, on_value, workers=None, timeout=None, profile_dir=None):
+    # Runs model tasks on the process pool, serving unchanged fits from the fit
+    # cache. Every task returns {horizon: {name: array}}; on_value(task_key, value)
+    # is called for cached and freshly fitted values alike.
+    to_run = []
+    keys = {}
+    for task in tasks:
+        if cache is not None:
+            keys[task.key] = cache_key(task)
+            value = cache.get(keys[task.key])
+            if value is not None:
+                print(f'  {task.key[2]} ({task.key[3]}) for {task.key[0]} ({task.key[1]}d) served from cache')
+                on_value(task.key, value)
+                continue
+        to_run.append(task)
+
+    def on_result(result):
+        ticker, horizon, model, mode = result.key
+        if result.status != 'ok':
+            print(f'  {model} ({mode}) failed for {ticker} ({horizon}d): {result.status}')
+            return
+        print(f'  {model} ({mode}) for {ticker} ({horizon}d) finished in {result.wall_time:.1f}s')
+        if cache is not None:
+            cache.put(keys[result.key], result.value)
+        on_value(result.key, result.value)
+
+    results = run_tasks(to_run, workers=workers, timeout=timeout, on_result=on_result, profile_dir=profile_dir)
+    if cache is not None:
+        cache.report()
+    return results
+
+
+def compare_fit_modes(series, forecasts, results, report_path):
+    # forecasts: {fit_mode: {(ticker, horizon, model): forecast array}}
+    # results: task results of the run (for the fit time spent in each mode)
+    wall_times = {mode: sum(r.wall_time for r in results if r.key[3] == mode) for mode in fit_modes}
+    rows = []
+    for (ticker, horizon, model), refit in forecasts['refit'].items():
+        shared = forecasts['shared'].get((ticker, horizon, model))
+        if shared is None:
+            continue
+        actual = series[ticker].values[-horizon:]
+        rows.append({
+            'Ticker': ticker,
+            'Horizon': horizon,
+            'Model': model,
+            'Refit_MAE': np.nanmean(np.abs(actual - refit)),
+            'Shared_MAE': np.nanmean(np.abs(actual - shared)),
+            'Max_Forecast_Diff': np.nanmax(np.abs(refit - shared)),
+        })
+    comparison = pd.DataFrame(rows)
+    comparison['MAE_Change'] = comparison['Shared_MAE'] - comparison['Refit_MAE']
+    print('\nFit mode comparison (shared fit vs full refit):')
+    print(comparison.to_string(index=False))
+    print(f"Total fit time: refit {wall_times['refit']:.1f}s, shared {wall_times['shared']:.1f}s")
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    comparison.to_csv(report_path, index=False)
+    print(f'Comparison saved as {report_path}')
+    return comparison
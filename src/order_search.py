@@ -0,0 +1,230 @@
+import argparse
+import json
+import math
+import os
+import time
+import warnings
+import numpy as np
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+from statsmodels.tsa.stattools import kpss
+
+from model_utils import load_close_series
+from task_runner import Task, run_tasks, default_workers
+from instrumentation import span, write_run_report
+
+# Automatic ARIMA/SARIMA order selection per ticker.
+# The differencing order d is picked first with repeated KPSS tests (AIC is not
+# comparable across different d). Every (p, q)(P, Q) candidate is then scored by
+# AIC with successive halving: all candidates are fitted on a short recent window,
+# only the best 1/eta of them per ticker go on to the next, longer window, and only
+# the last few survivors are fitted on the full history. Fits run on the task pool
+# in chunks of candidates, all tickers of a rung at once.
+# The chosen order is cached per ticker and model in data/cache/orders.json and
+# reused until the grid changes or the data has drifted (see needs_search).
+
+orders_path = 'data/cache/orders.json'
+search_models = ['ARIMA', 'SARIMA']
+arima_grid = {'p': range(0, 6), 'q': range(0, 4)}
+sarima_grid = {'p': range(0, 3), 'q': range(0, 3), 'P': range(0, 2), 'Q': range(0, 2)}
+seasonal_period = 5  # trading week, as in model_sarima.py
+seasonal_d = 1
+max_d = 2
+rung_windows = [250, 750, None]  # trading days per rung; None is the full history
+eta = 3  # keep the best 1/eta candidates per ticker after each rung
+# Drift check: search again when this many rows were added since the search, or
+# when the recent volatility of daily log returns moved by more than the tolerance
+max_new_rows = 250
+volatility_window = 250
+volatility_tolerance = 0.25
+min_volatility = 1e-8  # below this the cached series counts as flat
+
+
+# --- Candidates ---
+
+def choose_d(values, alpha=0.05):
+    # Smallest d for which KPSS does not reject stationarity
+    for d in range(max_d + 1):
+        diffed = np.diff(values, n=d) if d else values
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # p-values outside the lookup table
+            p_value = kpss(diffed, regression='c', nlags='auto')[1]
+        if p_value > alpha:
+            return d
+    return max_d
+
+
+def candidate_grid(model, d):
+    # [(order, seasonal_order)] for one ticker
+    if model == 'ARIMA':
+        return [((p, d, q), (0, 0, 0, 0)) for p in arima_grid['p'] for q in arima_grid['q']]
+    return [((p, d, q), (P, seasonal_d, Q, seasonal_period))
+            for p in sarima_grid['p'] for q in sarima_grid['q'] for P in sarima_grid['P'] for Q in sarima_grid['Q']]
+
+
+def grid_config(model):
+    grid = arima_grid if model == 'ARIMA' else {**sarima_grid, 's': [seasonal_period], 'D': [seasonal_d]}
+    return json.dumps({name: list(values) for name, values in grid.items()} | {'max_d': max_d}, sort_keys=True)
+
+
+def fit_candidates(model, values, candidates):
+    # Worker task: [(candidate, AIC)], with AIC inf when the fit fails
+    scores = []
+    for order, seasonal_order in candidates:
+        with span('fit', Order=str(order), Seasonal_Order=str(seasonal_order)), warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # convergence / start-parameter warnings
+            try:
+                if model == 'ARIMA':
+                    fit = ARIMA(values, order=order).fit()
+                else:
+                    fit = SARIMAX(values, order=order, seasonal_order=seasonal_order).fit(disp=False)
+                aic = float(fit.aic)
+            except Exception:
+                aic = math.inf
+        scores.append(((order, seasonal_order), aic if np.isfinite(aic) else math.inf))
+    return scores
+
+
+# --- Search ---
+
+def search_orders(series, model, workers=None, timeout=None, chunk_size=4):
+    # series: {ticker: 1-D array}. Returns ({ticker: {'order', 'seasonal_order', 'aic', 'd'}},
+    # task results of every rung)
+    survivors = {}
+    for ticker, values in series.items():
+        d = choose_d(values)
+        survivors[ticker] = candidate_grid(model, d)
+    grid_size = {ticker: len(candidates) for ticker, candidates in survivors.items()}
+    all_results = []
+    scores = {}
+    fitted_rows = 0
+    for rung, window in enumerate(rung_windows):
+        start = time.perf_counter()
+        tasks = []
+        for ticker, candidates in survivors.items():
+            values = series[ticker] if window is None else series[ticker][-window:]
+            for i in range(0, len(candidates), chunk_size):
+                tasks.append(Task((ticker, rung, i // chunk_size), fit_candidates, (model, values, candidates[i:i + chunk_size])))
+        with span('rung', Model=model, Rung=rung):
+            results = run_tasks(tasks, workers=workers, timeout=timeout)
+        all_results.extend(results)
+        scores = {ticker: [] for ticker in survivors}
+        for r in results:
+            if r.status == 'ok':
+                scores[r.key[0]].extend(r.value)
+            else:
+                print(f'  {model} search chunk {r.key} failed: {r.status}')
+        fitted = sum(len(c) for c in survivors.values())
+        fitted_rows += sum(len(c) * len(series[t] if window is None else series[t][-window:]) for t, c in survivors.items())
+        last = rung == len(rung_windows) - 1
+        for ticker, scored in scores.items():
+            ranked = [candidate for candidate, aic in sorted(scored, key=lambda s: s[1]) if np.isfinite(aic)]
+            survivors[ticker] = ranked[:1 if last else max(1, math.ceil(len(ranked) / eta))]
+        survivors = {ticker: candidates for ticker, candidates in survivors.items() if candidates}
+        label = 'full history' if window is None else f'last {window} days'
+        print(f'  {model} rung {rung + 1} ({label}): {fitted} fits for {len(scores)} tickers in '
+              f'{time.perf_counter() - start:.1f}s, {sum(len(c) for c in survivors.values())} candidates kept')
+    exhaustive_rows = sum(size * len(series[ticker]) for ticker, size in grid_size.items())
+    print(f'  {model} search fitted {fitted_rows / exhaustive_rows:.0%} of the observations an exhaustive '
+          f'full-history grid ({sum(grid_size.values())} fits) would')
+
+    chosen = {}
+    for ticker, candidates in survivors.items():
+        aic = dict(scores[ticker])[candidates[0]]
+        order, seasonal_order = candidates[0]
+        chosen[ticker] = {'order': list(order), 'seasonal_order': list(seasonal_order), 'aic': aic, 'd': order[1]}
+    for ticker in series:
+        if ticker not in chosen:
+            print(f'  {model} search found no usable order for {ticker}')
+    return chosen, all_results
+
+
+# --- Cache of chosen orders ---
+
+def load_orders(path=orders_path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_orders(orders, path=orders_path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(orders, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def recent_volatility(values):
+    returns = np.diff(np.log(values[-(volatility_window + 1):]))
+    return float(np.std(returns))
+
+
+def needs_search(entry, model, values):
+    # Reason to search again, or None when the cached order is still valid
+    if entry is None:
+        return 'no cached order'
+    if entry['grid'] != grid_config(model):
+        return 'search grid changed'
+    if len(values) < entry['rows']:
+        return 'history was rewritten'
+    if len(values) - entry['rows'] > max_new_rows:
+        return f"{len(values) - entry['rows']} new rows"
+    if entry['volatility'] < min_volatility:
+        # Flat/stale series at search time: no relative change to measure
+        return 'no volatility at the last search'
+    change = recent_volatility(values) / entry['volatility'] - 1
+    if abs(change) > volatility_tolerance:
+        return f'volatility changed by {change:+.0%}'
+    return None
+
+
+def select_orders(series, model, workers=None, timeout=None, force=False, path=orders_path):
+    # {ticker: (order, seasonal_order)} for the Close series in `series`, searching
+    # only the tickers without a valid cached order
+    orders = load_orders(path)
+    cached = orders.setdefault(model, {})
+    values = {ticker: np.asarray(close.dropna(), dtype=float) for ticker, close in series.items()}
+    stale = {}
+    for ticker, v in values.items():
+        reason = 'forced' if force else needs_search(cached.get(ticker), model, v)
+        if reason:
+            stale[ticker] = reason
+    if stale:
+        print(f'Searching {model} orders for {len(stale)} tickers '
+              f'({", ".join(f"{t}: {reason}" for t, reason in stale.items())})...')
+        chosen, results = search_orders({t: values[t] for t in stale}, model, workers, timeout)
+        for ticker, entry in chosen.items():
+            entry.update({'grid': grid_config(model), 'rows': len(values[ticker]),
+                          'volatility': recent_volatility(values[ticker]), 'searched': time.strftime('%Y-%m-%d')})
+            cached[ticker] = entry
+        save_orders(orders, path)
+    else:
+        results = []
+    print(f'{model} orders ({len(values) - len(stale)} served from {path}):')
+    for ticker in values:
+        if ticker in cached:
+            entry = cached[ticker]
+            print(f"  {ticker}: {tuple(entry['order'])}{tuple(entry['seasonal_order']) if model == 'SARIMA' else ''} "
+                  f"(AIC {entry['aic']:.1f}, searched {entry['searched']})")
+    chosen = {ticker: (tuple(cached[ticker]['order']), tuple(cached[ticker]['seasonal_order']))
+              for ticker in values if ticker in cached}
+    return chosen, results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Select ARIMA/SARIMA orders per ticker by AIC with successive halving.')
+    parser.add_argument('--models', nargs='*', choices=search_models, default=search_models)
+    parser.add_argument('--tickers', nargs='*', help='Tickers to search (default: all)')
+    parser.add_argument('--workers', type=int, default=default_workers(), help='Number of worker processes')
+    parser.add_argument('--timeout', type=float, default=600, help='Per-chunk timeout in seconds')
+    parser.add_argument('--force', action='store_true', help=f'Search again even when {orders_path} has a valid order')
+    args = parser.parse_args()
+    started = time.time()
+    with span('load'):
+        series = load_close_series(args.tickers)
+    results = []
+    for model in args.models:
+        results.extend(select_orders(series, model, args.workers, args.timeout, args.force)[1])
+    write_run_report('order_search', results, ['Ticker', 'Rung', 'Chunk'], started)
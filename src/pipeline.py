@@ -0,0 +1,366 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from data_store import read_store, list_tickers, replace_tickers, partition_path
+from feature_engineering import build_features, load_state, save_state
+from fit_cache import FitCache
+from model_utils import load_close_series, run_cached_tasks
+from task_runner import default_workers
+from instrumentation import span, write_run_report
+from merge_model_results import index_model_outputs, forecast_columns, forecast_order, merge_ticker, write_merged_csvs, output_dir
+from render_plots import render_plots, plot_path, forecast_horizons
+import feature_engineering
+import merge_model_results
+import model_arima_prophet
+import model_sarima
+
+# Pipeline DAG runner.
+# Runs the pipeline after the download as a graph of nodes with declared inputs
+# and outputs, and only re-executes the nodes whose inputs changed:
+#   features/{ticker}                    prices partition -> features partition
+#   fit/{ticker}/{horizon}/{model}       ticker's Close series -> forecast (ARIMA, Prophet, SARIMA)
+#   results/{ticker}/{horizon}/{source}  fits -> data/model_outputs/{ticker}_{source}_results_{horizon}.csv
+#   merge/{ticker}                       results files -> model_results partition and merged CSVs
+#   plots/{ticker}                       results files and history -> forecast PNGs
+# Every node's inputs are reduced to a digest: file sizes/mtimes for store
+# partitions, content hashes for series and results files, and the source of the
+# code that produces it. The digests and output fingerprints of the last
+# successful run are kept in data/cache/pipeline_state.json. A node runs when its
+# digest changed, an output is missing or was modified, or an upstream node reran.
+# All fits of a run go to the worker pool together, and each ticker is merged as
+# soon as its own fits are done.
+
+state_path = 'data/cache/pipeline_state.json'
+pipeline_models = ['ARIMA', 'Prophet', 'SARIMA']
+model_sources = {'ARIMA': 'arima_prophet', 'Prophet': 'arima_prophet', 'SARIMA': 'sarima'}
+model_modules = {'ARIMA': model_arima_prophet, 'Prophet': model_arima_prophet, 'SARIMA': model_sarima}
+features_state_path = 'data/store/features_state.json'
+shown_per_stage = 20  # dry-run: nodes listed per stage
+
+
+# --- Digests and state ---
+
+def digest_of(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode() if not isinstance(part, bytes) else part)
+    return digest.hexdigest()
+
+
+def code_digest(module):
+    with open(module.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def output_fingerprint(path):
+    # (size, mtime) of a file, or of every file in a directory; None when missing
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    if os.path.isdir(path):
+        return sorted([name, *output_fingerprint(os.path.join(path, name))] for name in os.listdir(path)
+                      if os.path.isfile(os.path.join(path, name)))
+    return None
+
+
+def load_pipeline_state(path=state_path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_pipeline_state(state, path=state_path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def stale_reason(state, node, digest, force=False):
+    # Why `node` has to run, or None when it is up to date
+    if force:
+        return 'forced'
+    entry = state.get(node)
+    if entry is None:
+        return 'never run'
+    if entry['digest'] != digest:
+        return 'inputs changed'
+    for path, fingerprint in entry['outputs'].items():
+        current = output_fingerprint(path)
+        if current is None:
+            return f'{path} missing'
+        if current != fingerprint:
+            return f'{path} modified'
+    return None
+
+
+def record(state, node, digest, outputs):
+    state[node] = {'digest': digest, 'outputs': {path: output_fingerprint(path) for path in outputs}}
+
+
+# --- Node inputs ---
+
+def series_digest(close):
+    return hashlib.sha256(np.ascontiguousarray(close.to_numpy(dtype='float64')).tobytes()).hexdigest()
+
+
+def fit_cache_key(task):
+    return model_modules[task.key[2]].cache_key(task)
+
+
+def fit_tasks(series, models):
+    # Per-horizon (refit) tasks of the model scripts, keyed (ticker, horizon, model, fit_mode)
+    tasks = []
+    arima_prophet_models = [m for m in model_arima_prophet.models if m in models]
+    if arima_prophet_models:
+        tasks.extend(model_arima_prophet.build_tasks(series, 'refit', arima_prophet_models))
+    if 'SARIMA' in models:
+        tasks.extend(model_sarima.build_tasks(series, 'refit'))
+    return tasks
+
+
+def results_file(ticker, horizon, source):
+    return os.path.join(output_dir, f'{ticker}_{source}_results_{horizon}.csv')
+
+
+def ticker_sources(ticker, index, models):
+    # {source: {horizon: path}} of the results files merged for a ticker: the
+    # pipeline's own sources plus any other model outputs already on disk
+    sources = {source: dict(horizons) for source, horizons in index.get(ticker, {}).items()}
+    for model in models:
+        for horizon in forecast_horizons:
+            path = results_file(ticker, horizon, model_sources[model])
+            if os.path.exists(path):
+                sources.setdefault(model_sources[model], {})[horizon] = path
+    return sources
+
+
+def results_digest(sources):
+    return {source: {str(h): file_digest(path) for h, path in sorted(horizons.items())}
+            for source, horizons in sorted(sources.items())}
+
+
+def merged_columns(index, sources):
+    # Forecast columns of the files on disk plus those the pipeline's sources write
+    columns = set(forecast_columns(index)) | {f'{model}_Forecast' for model, source in model_sources.items() if source in sources}
+    return sorted(columns, key=lambda c: (forecast_order.index(c) if c in forecast_order else len(forecast_order), c))
+
+
+# --- Runner ---
+
+def show_plan(stage, plan, total):
+    print(f'{stage}: {len(plan)} of {total} nodes to run')
+    for node, reason in list(plan.items())[:shown_per_stage]:
+        print(f'  {node}: {reason}')
+    if len(plan) > shown_per_stage:
+        print(f'  ... and {len(plan) - shown_per_stage} more')
+
+
+def run_pipeline(tickers=None, models=pipeline_models, dry_run=False, force=False, workers=None, timeout=None,
+                 use_cache=True, plots=True):
+    started = time.time()
+    state = load_pipeline_state()
+    tickers = tickers or list_tickers('prices')
+    sources = sorted({model_sources[m] for m in models})
+
+    # --- features/{ticker} ---
+    features_code = code_digest(feature_engineering)
+    plan = {}
+    digests = {}
+    for ticker in tickers:
+        node = f'features/{ticker}'
+        digests[node] = digest_of(output_fingerprint(partition_path('prices', ticker)), features_code)
+        reason = stale_reason(state, node, digests[node], force)
+        if reason:
+            plan[node] = reason
+    show_plan('features', plan, len(tickers))
+    stale_features = {node.split('/', 1)[1] for node in plan}
+    if stale_features and not dry_run:
+        with span('features', Tickers=len(stale_features)):
+            prices = read_store('prices', tickers=sorted(stale_features))
+            df_features, features_state = build_features(prices, with_state=True)
+            replace_tickers(df_features, 'features')
+            saved_state = load_state(features_state_path) if os.path.exists(features_state_path) else {}
+            saved_state.update(features_state)
+            save_state(saved_state, features_state_path)
+        for ticker in stale_features:
+            record(state, f'features/{ticker}', digests[f'features/{ticker}'], [partition_path('features', ticker)])
+        save_pipeline_state(state)
+        print(f'Recomputed features for {len(stale_features)} tickers')
+
+    # --- fit/{ticker}/{horizon}/{model} and results/{ticker}/{horizon}/{source} ---
+    # (a dry run has no new features yet, so everything downstream of them is stale)
+    upstream = stale_features if dry_run else set()
+    ready = [ticker for ticker in tickers if ticker not in upstream]
+    with span('load'):
+        series = load_close_series(ready) if ready else {}
+    tasks = fit_tasks(series, models)
+    fit_plan, results_plan = {}, {}
+    fit_digests, results_fits = {}, {}
+    for ticker in upstream:
+        for model in models:
+            for horizon in forecast_horizons:
+                node = f'fit/{ticker}/{horizon}/{model}'
+                results_fits.setdefault(f'results/{ticker}/{horizon}/{model_sources[model]}', []).append(node)
+                fit_plan[node] = f'upstream features/{ticker} will rerun'
+    for task in tasks:
+        ticker, horizon, model, _ = task.key
+        node = f'fit/{ticker}/{horizon}/{model}'
+        results_fits.setdefault(f'results/{ticker}/{horizon}/{model_sources[model]}', []).append(node)
+        fit_digests[node] = digest_of(fit_cache_key(task), code_digest(model_modules[model]))
+        reason = stale_reason(state, node, fit_digests[node], force)
+        if reason:
+            fit_plan[node] = reason
+    for results_node, fit_nodes in results_fits.items():
+        _, ticker, horizon, source = results_node.split('/')
+        stale_fits = [node for node in fit_nodes if node in fit_plan]
+        if stale_fits:
+            reason = f'upstream {stale_fits[0]} will rerun'
+        else:
+            reason = stale_reason(state, results_node, digest_of([fit_digests[node] for node in fit_nodes]))
+        if reason:
+            # The results file is rewritten from all of its fits; the up-to-date
+            # ones are served from the fit cache (or refit when evicted)
+            results_plan[results_node] = reason
+            for node in fit_nodes:
+                fit_plan.setdefault(node, f'{results_node} is rewritten')
+    show_plan('fit', fit_plan, sum(len(nodes) for nodes in results_fits.values()))
+    show_plan('results', results_plan, len(results_fits))
+
+    # --- merge/{ticker} and plots/{ticker}: planned before the fits run ---
+    index = index_model_outputs() if os.path.isdir(output_dir) else {}
+    columns = merged_columns(index, sources)
+    merge_code = code_digest(merge_model_results)
+
+    def merge_digest(ticker):
+        return digest_of(results_digest(ticker_sources(ticker, index, models)), columns, merge_code)
+
+    def plots_digest(ticker):
+        return digest_of(results_digest(ticker_sources(ticker, {}, models)), series_digest(series[ticker]))
+
+    pending_results = {}  # ticker -> results nodes still to be written
+    for results_node in results_plan:
+        pending_results.setdefault(results_node.split('/')[1], set()).add(results_node)
+    merge_plan, plots_plan = {}, {}
+    for ticker in tickers:
+        if ticker in pending_results:
+            merge_plan[f'merge/{ticker}'] = 'upstream results will be rewritten'
+            plots_plan[f'plots/{ticker}'] = 'upstream results will be rewritten'
+            continue
+        if ticker not in series:
+            continue
+        reason = stale_reason(state, f'merge/{ticker}', merge_digest(ticker), force)
+        if reason:
+            merge_plan[f'merge/{ticker}'] = reason
+        reason = stale_reason(state, f'plots/{ticker}', plots_digest(ticker), force)
+        if plots and reason:
+            plots_plan[f'plots/{ticker}'] = reason
+    show_plan('merge', merge_plan, len(tickers))
+    if plots:
+        show_plan('plots', plots_plan, len(tickers))
+    if dry_run:
+        print('Dry run: nothing was executed.')
+        return []
+
+    def merge(ticker):
+        node = f'merge/{ticker}'
+        ticker_files = ticker_sources(ticker, index, models)
+        if not ticker_files:
+            return
+        with span('merge', Ticker=ticker):
+            merged = merge_ticker(ticker, ticker_files, columns)
+            replace_tickers(merged, 'model_results')
+            write_merged_csvs(ticker, merged)
+        outputs = [os.path.join(output_dir, f'{ticker}_all_models_results_{h}.csv') for h in merged['Horizon'].unique()]
+        record(state, node, merge_digest(ticker), outputs + [partition_path('model_results', ticker)])
+        print(f'  Merged {ticker}')
+
+    # Fits run on the worker pool; a results file is written as soon as all of its
+    # fits are in, and a ticker is merged as soon as all of its results files are
+    done_fits = {}
+
+    def write_results(results_node):
+        _, ticker, horizon, source = results_node.split('/')
+        horizon = int(horizon)
+        fitted = {node.rsplit('/', 1)[1]: done_fits[node] for node in results_fits[results_node]}
+        if source == 'arima_prophet':
+            for model in model_arima_prophet.models:
+                if model not in fitted:
+                    # Model not run by the pipeline: keep its column from the existing file
+                    path = results_file(ticker, horizon, source)
+                    forecast = pd.read_csv(path)[f'{model}_Forecast'].to_numpy() if os.path.exists(path) else np.full(horizon, np.nan)
+                    fitted[model] = {'forecast': forecast}
+            model_arima_prophet.save_results(ticker, horizon, series[ticker], fitted['ARIMA'], fitted['Prophet'])
+        else:
+            model_sarima.save_results(ticker, horizon, series[ticker], fitted['SARIMA']['forecast'])
+        record(state, results_node, digest_of([fit_digests[node] for node in results_fits[results_node]]),
+               [results_file(ticker, horizon, source)])
+        pending_results[ticker].discard(results_node)
+        if not pending_results[ticker]:
+            merge(ticker)
+            merge_plan.pop(f'merge/{ticker}', None)
+            save_pipeline_state(state)
+
+    def on_value(key, value):
+        ticker, horizon, model, _ = key
+        node = f'fit/{ticker}/{horizon}/{model}'
+        done_fits[node] = value[horizon]
+        record(state, node, fit_digests[node], [])
+        results_node = f'results/{ticker}/{horizon}/{model_sources[model]}'
+        if all(n in done_fits for n in results_fits[results_node]):
+            write_results(results_node)
+
+    run = [task for task in tasks if f'fit/{task.key[0]}/{task.key[1]}/{task.key[2]}' in fit_plan]
+    cache = FitCache() if use_cache else None
+    with span('fits', Tasks=len(run)):
+        results = run_cached_tasks(run, cache, fit_cache_key, on_value, workers=workers, timeout=timeout)
+    for ticker, nodes in pending_results.items():
+        if nodes:
+            print(f'  {ticker}: not merged, {len(nodes)} results files are missing fits')
+
+    # Merges that were stale for other reasons (e.g. a deleted merged CSV)
+    for node in list(merge_plan):
+        ticker = node.split('/', 1)[1]
+        if not pending_results.get(ticker):
+            merge(ticker)
+    save_pipeline_state(state)
+
+    write_run_report('pipeline', results, ['Ticker', 'Horizon', 'Model', 'Fit_Mode'], started)
+    if plots:
+        replot = [node.split('/', 1)[1] for node in plots_plan if not pending_results.get(node.split('/', 1)[1])]
+        if replot:
+            render_plots(sources, series={ticker: series[ticker] for ticker in replot}, workers=workers)
+            for ticker in replot:
+                pngs = [plot_path(ticker, source, h) for source in sources for h in forecast_horizons
+                        if os.path.exists(results_file(ticker, h, source))]
+                record(state, f'plots/{ticker}', plots_digest(ticker), pngs)
+            save_pipeline_state(state)
+    print(f'Pipeline complete; node state saved to {state_path}')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run features, models, merge and plots, re-executing only out-of-date nodes.')
+    parser.add_argument('--tickers', nargs='*', help='Tickers to run (default: all in the prices store)')
+    parser.add_argument('--models', nargs='*', choices=pipeline_models, default=pipeline_models)
+    parser.add_argument('--dry-run', action='store_true', help='Only show which nodes would run and why')
+    parser.add_argument('--force', action='store_true', help='Run every node, up to date or not')
+    parser.add_argument('--workers', type=int, default=default_workers(), help='Number of worker processes')
+    parser.add_argument('--timeout', type=float, default=1800, help='Per-fit timeout in seconds')
+    parser.add_argument('--no-cache', action='store_true', help='Do not serve fits from data/cache/fits')
+    parser.add_argument('--no-plots', action='store_true', help='Skip the plots nodes')
+    args = parser.parse_args()
+    run_pipeline(args.tickers, args.models, args.dry_run, args.force, args.workers, args.timeout,
+                 use_cache=not args.no_cache, plots=not args.no_plots)
@@ -0,0 +1,128 @@
+import argparse
+import os
+import time
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from task_runner import Task, run_tasks, default_workers
+from model_utils import load_close_series
+from instrumentation import span, write_run_report
+
+# Forecast plot rendering stage.
+# Reads the results CSVs written by the model scripts and renders one PNG per
+# (ticker, horizon, plot kind) on the task-runner worker pool. Only a trailing
+# window of the training history is drawn. A sidecar file next to every PNG holds
+# a hash of its inputs, so plots whose results and history are unchanged are
+# skipped.
+
+forecast_horizons = [7, 30, 90, 180]
+plot_window = 250  # trailing trading days of training data shown
+plot_version = 1  # bump when the plot style changes to re-render everything
+
+# kind -> title and the forecast columns drawn from its results file (label, color)
+plot_kinds = {
+    'sarima': {
+        'title': 'SARIMA',
+        'forecasts': {'SARIMA_Forecast': ('SARIMA Forecast', 'magenta')},
+    },
+    'arima_prophet': {
+        'title': 'ARIMA & Prophet',
+        'forecasts': {'ARIMA_Forecast': ('ARIMA Forecast', 'red'), 'Prophet_Forecast': ('Prophet Forecast', 'green')},
+    },
+}
+
+
+def results_path(ticker, kind, horizon):
+    return f'data/model_outputs/{ticker}_{kind}_results_{horizon}.csv'
+
+
+def plot_path(ticker, kind, horizon):
+    return f'data/model_outputs/{ticker}_{kind}_forecast_{horizon}.png'
+
+
+def inputs_hash(results_file, train, window):
+    digest = hashlib.sha256()
+    with open(results_file, 'rb') as f:
+        digest.update(f.read())
+    digest.update(np.ascontiguousarray(train.to_numpy(dtype='float64')).tobytes())
+    digest.update(np.asarray(train.index.astype('datetime64[ns]')).view('int64').tobytes())
+    digest.update(json.dumps([window, plot_version]).encode())
+    return digest.hexdigest()
+
+
+def render_plot(ticker, kind, horizon, train, results_file, png_path, digest):
+    with span('plot'):
+        results = pd.read_csv(results_file, parse_dates=['Date'])
+        plt.figure(figsize=(14, 7))
+        plt.plot(train.index, train.values, label='Train', color='blue')
+        plt.plot(results['Date'], results['Actual'], label='Test', color='black')
+        for column, (label, color) in plot_kinds[kind]['forecasts'].items():
+            plt.plot(results['Date'], results[column], label=label, color=color, linestyle='--')
+        plt.title(f"{ticker} Close Price Forecast ({plot_kinds[kind]['title']}, {horizon} days)")
+        plt.xlabel('Date')
+        plt.ylabel('Close Price')
+        plt.legend()
+        plt.tight_layout()
+        plt.savefig(png_path)
+        plt.close()
+    # Written last, so an interrupted render is redone on the next run
+    with open(png_path + '.hash', 'w') as f:
+        f.write(digest)
+    return png_path
+
+
+def plan_plots(series, kinds, horizons, window=plot_window, force=False):
+    # Returns the render tasks for plots that are missing or whose inputs changed
+    tasks = []
+    skipped = 0
+    for ticker, close in series.items():
+        for kind in kinds:
+            for horizon in horizons:
+                results_file = results_path(ticker, kind, horizon)
+                if not os.path.exists(results_file):
+                    continue
+                train = close.iloc[:-horizon].iloc[-window:]
+                digest = inputs_hash(results_file, train, window)
+                png_path = plot_path(ticker, kind, horizon)
+                if not force and os.path.exists(png_path) and os.path.exists(png_path + '.hash'):
+                    with open(png_path + '.hash') as f:
+                        if f.read() == digest:
+                            skipped += 1
+                            continue
+                tasks.append(Task((ticker, horizon, kind), render_plot,
+                                  (ticker, kind, horizon, train, results_file, png_path, digest)))
+    return tasks, skipped
+
+
+def render_plots(kinds=tuple(plot_kinds), series=None, window=plot_window, workers=None, force=False):
+    started = time.time()
+    if series is None:
+        with span('load'):
+            series = load_close_series()
+    tasks, skipped = plan_plots(series, kinds, forecast_horizons, window, force)
+    print(f'Rendering {len(tasks)} forecast plots ({skipped} unchanged, skipped)...')
+
+    def on_result(result):
+        if result.status != 'ok':
+            print(f'  Plot failed for {result.key}: {result.status} {result.error.strip().splitlines()[-1] if result.error else ""}')
+
+    results = run_tasks(tasks, workers=workers, on_result=on_result)
+    rendered = sum(r.status == 'ok' for r in results)
+    print(f'Rendered {rendered} plots in data/model_outputs/')
+    write_run_report('render_plots', results, ['Ticker', 'Horizon', 'Plot'], started)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render forecast plots from the model results files.')
+    parser.add_argument('--kinds', nargs='*', choices=list(plot_kinds), default=list(plot_kinds), help='Plots to render')
+    parser.add_argument('--window', type=int, default=plot_window, help='Trailing trading days of training data to draw')
+    parser.add_argument('--workers', type=int, default=default_workers(), help='Number of worker processes')
+    parser.add_argument('--force', action='store_true', help='Re-render plots even if their inputs are unchanged')
+    args = parser.parse_args()
+    render_plots(args.kinds, window=args.window, workers=args.workers, force=args.force)
@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+from data_store import load_prices, write_store, read_manifest, list_tickers, compact_tickers
+from downloader import price_columns, sources
+from feature_engineering import build_features, extend_bar, load_state, save_state
+from fit_cache import FitCache, fit_key
+from instrumentation import span
+from model_utils import run_cached_tasks
+from task_runner import Task, default_workers
+from model_arima_prophet import arima_order
+from model_sarima import sarima_order, sarima_seasonal_order
+
+# Streaming update mode.
+# New OHLCV bars arrive from a pluggable feed (BarFeed) on an asyncio loop. Each
+# bar updates its ticker's indicators from the saved incremental state (work
+# bounded by the state window) and extends the fitted ARIMA/SARIMA states by one
+# observation with fixed parameters (statsmodels `extend`, no refit). Fresh
+# forecasts are published to data/live/forecasts.json every publish interval for
+# the dashboard, and new bars are appended to the prices/features stores every
+# flush interval (a ticker's small appended files are compacted once there are
+# more than compact_files of them).
+
+live_path = 'data/live/forecasts.json'
+state_path = 'data/store/features_state.json'
+stream_models = ['ARIMA', 'SARIMA']
+
+
+# --- Feeds ---
+
+class BarFeed:
+    # bars() is an async iterator of (ticker, bar) where bar has price_columns
+    name = 'base'
+
+    async def bars(self):
+        raise NotImplementedError
+        yield
+
+
+class ReplayFeed(BarFeed):
+    # Test stand-in for a live feed: replays data/{ticker}_10y.csv bars after
+    # `start` in date order (all tickers interleaved), `interval` seconds apart
+    name = 'replay'
+
+    def __init__(self, tickers, start, directory='data', pattern='{ticker}_10y.csv', interval=0.0):
+        self.tickers = tickers
+        self.start = pd.Timestamp(start)
+        self.directory = directory
+        self.pattern = pattern
+        self.interval = interval
+
+    async def bars(self):
+        frames = []
+        for ticker in self.tickers:
+            path = os.path.join(self.directory, self.pattern.format(ticker=ticker))
+            if os.path.exists(path):
+                df = pd.read_csv(path, usecols=price_columns, parse_dates=['Date'])
+                frames.append(df[df['Date'] > self.start].assign(Ticker=ticker))
+        if not frames:
+            return
+        replay = pd.concat(frames, ignore_index=True).sort_values(['Date'], kind='stable')
+        for row in replay.to_dict('records'):
+            yield row.pop('Ticker'), row
+            await asyncio.sleep(self.interval)
+
+
+class PollingFeed(BarFeed):
+    # Polls a downloader PriceSource for bars newer than the last one seen. Only
+    # closed bars are emitted: today's daily bar is still forming, and once a bar
+    # is emitted it is persisted and folded into the indicator state for good
+    name = 'poll'
+
+    def __init__(self, tickers, source, last_dates, poll_interval=60.0):
+        self.tickers = tickers
+        self.source = source
+        self.last_dates = {t: pd.Timestamp(d) for t, d in last_dates.items()}
+        self.poll_interval = poll_interval
+
+    async def bars(self):
+        while True:
+            current = pd.Timestamp.today().normalize()  # start of the bar still in progress
+            start = min(self.last_dates.values(), default=current) + pd.Timedelta(days=1)
+            end = current  # exclusive: up to the last closed bar
+            fetched = {}
+            if start < end:  # else every closed bar has been seen already
+                try:
+                    fetched = await asyncio.to_thread(self.source.fetch, self.tickers, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+                except Exception as e:
+                    print(f'  Poll failed ({e}); retrying in {self.poll_interval:.0f}s')
+            for ticker, df in fetched.items():
+                last = self.last_dates.get(ticker, pd.Timestamp.min)
+                dates = pd.to_datetime(df['Date'])
+                for row in df[(dates > last) & (dates < current)].to_dict('records'):
+                    self.last_dates[ticker] = pd.Timestamp(row['Date'])
+                    yield ticker, row
+            await asyncio.sleep(self.poll_interval)
+
+
+# --- Models ---
+
+def build_model(model, values):
+    if model == 'ARIMA':
+        return ARIMA(values, order=arima_order)
+    return SARIMAX(values, order=sarima_order, seasonal_order=sarima_seasonal_order)
+
+
+def fit_params(model, values, horizon):
+    # Runs on the worker pool; only the parameters travel back
+    with span('fit'):
+        fit = build_model(model, values).fit() if model == 'ARIMA' else build_model(model, values).fit(disp=False)
+    return {horizon: {'params': np.asarray(fit.params)}}
+
+
+def stream_cache_key(task):
+    ticker, horizon, model, _ = task.key
+    config = {'order': arima_order} if model == 'ARIMA' else {'order': sarima_order, 'seasonal_order': sarima_seasonal_order}
+    config['fit_mode'] = 'stream'
+    return fit_key(task.args[1], model, config)
+
+
+class LiveUpdater:
+    def __init__(self, horizon=30, models=stream_models, persist=True, compact_files=8):
+        self.horizon = horizon
+        self.models = models
+        self.persist = persist
+        self.compact_files = compact_files
+        self.indicator_state = {}
+        self.fits = {}  # ticker -> {model: statsmodels results filtered up to the last bar}
+        self.latest = {}  # ticker -> last bar and indicators
+        self.received = {}  # ticker -> perf_counter time of the oldest unpublished bar
+        self.snapshot = {}
+        self.new_rows = []
+        self.bars = 0
+
+    def start(self, prices, state=None, workers=None):
+        # prices: history up to the stream start. The indicator state comes from
+        # the saved state when it matches, else from one pass over the history.
+        if state is None:
+            _, state = build_features(prices.copy(), with_state=True)
+        self.indicator_state = state
+        series = {ticker: df['Close'].to_numpy(dtype=float)
+                  for ticker, df in prices.groupby('Ticker', sort=False, observed=True)}
+        tasks = [Task((ticker, self.horizon, model, 'stream'), fit_params, (model, values, self.horizon))
+                 for ticker, values in series.items() for model in self.models]
+
+        def on_value(key, value):
+            ticker, _, model, _ = key
+            # Rebuild the fitted state on the whole history with the cached/fitted parameters
+            params = value[self.horizon]['params']
+            self.fits.setdefault(ticker, {})[model] = build_model(model, series[ticker]).filter(params)
+
+        print(f'Fitting {", ".join(self.models)} for {len(series)} tickers...')
+        run_cached_tasks(tasks, FitCache(), stream_cache_key, on_value, workers=workers)
+
+    def on_bar(self, ticker, bar):
+        date = pd.Timestamp(bar['Date'])
+        state = self.indicator_state.get(ticker)
+        if state is not None and date <= pd.Timestamp(state['last_date']):
+            return  # already seen
+        close = float(bar['Close'])
+        indicators, self.indicator_state[ticker] = extend_bar(state, close, date.strftime('%Y-%m-%d'))
+        for model, fit in self.fits.get(ticker, {}).items():
+            self.fits[ticker][model] = fit.extend(np.array([close]))
+        self.latest[ticker] = {'as_of': date.strftime('%Y-%m-%d'), 'close': close, 'indicators': indicators}
+        self.received.setdefault(ticker, time.perf_counter())
+        if self.persist:
+            self.new_rows.append({**{c: bar[c] for c in price_columns}, 'Ticker': ticker, **indicators})
+        self.bars += 1
+
+    def publish(self):
+        if not self.received:
+            return
+        for ticker in self.received:
+            latest = self.latest[ticker]
+            dates = pd.bdate_range(pd.Timestamp(latest['as_of']) + pd.offsets.BDay(1), periods=self.horizon)
+            self.snapshot[ticker] = {
+                **latest,
+                'dates': [d.strftime('%Y-%m-%d') for d in dates],
+                'forecasts': {model: np.asarray(fit.forecast(steps=self.horizon)).tolist()
+                              for model, fit in self.fits.get(ticker, {}).items()},
+            }
+        os.makedirs(os.path.dirname(live_path), exist_ok=True)
+        tmp_path = live_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'updated': time.strftime('%Y-%m-%dT%H:%M:%S'), 'horizon': self.horizon, 'tickers': self.snapshot}, f)
+        os.replace(tmp_path, live_path)
+        latency = time.perf_counter() - min(self.received.values())
+        print(f'  Published forecasts for {len(self.received)} tickers ({self.bars} bars so far, '
+              f'max bar-to-publish latency {latency * 1000:.0f} ms)')
+        self.received = {}
+
+    def flush(self):
+        if not self.new_rows:
+            return
+        rows = pd.DataFrame(self.new_rows)
+        write_store(rows[price_columns + ['Ticker']], 'prices', append=True)
+        write_store(rows.reindex(columns=read_manifest('features')['columns']), 'features', append=True)
+        save_state(self.indicator_state, state_path)
+        # Every flush adds one small file per ticker; merge them once there are
+        # compact_files, so long sessions do not slow down the store's readers
+        tickers = pd.unique(rows['Ticker'])
+        compacted = sum(compact_tickers(name, tickers, self.compact_files) for name in ['prices', 'features'])
+        print(f'  Appended {len(rows)} new bars to the prices and features stores'
+              + (f' (compacted {compacted} partitions)' if compacted else ''))
+        self.new_rows = []
+
+
+async def run_stream(feed, updater, publish_interval=1.0, flush_interval=30.0):
+    stop = asyncio.Event()
+
+    async def every(interval, fn):
+        # Runs fn every interval seconds, and once more when the feed ends
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            fn()
+
+    periodic = [asyncio.create_task(every(publish_interval, updater.publish)),
+                asyncio.create_task(every(flush_interval, updater.flush))]
+    try:
+        async for ticker, bar in feed.bars():
+            updater.on_bar(ticker, bar)
+            await asyncio.sleep(0)  # let the publisher run between bars
+    finally:
+        stop.set()
+        await asyncio.gather(*periodic)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream new bars and keep indicators and forecasts up to date.')
+    parser.add_argument('--feed', choices=['replay', 'poll'], default='replay',
+                        help='replay: replay data/{ticker}_10y.csv (offline test feed); poll: poll a price source for new bars')
+    parser.add_argument('--tickers', nargs='*', help='Tickers to follow (default: all in the prices store)')
+    parser.add_argument('--replay-from', help='Replay bars after this date (default: 90 days before the end of the prices store)')
+    parser.add_argument('--interval', type=float, default=0.05, help='Seconds between replayed bars')
+    parser.add_argument('--source', choices=sorted(sources), default='yahoo', help='Price source polled by --feed poll')
+    parser.add_argument('--poll-interval', type=float, default=60, help='Seconds between polls')
+    parser.add_argument('--horizon', type=int, default=30, help='Forecast horizon in trading days')
+    parser.add_argument('--models', nargs='*', choices=stream_models, default=stream_models)
+    parser.add_argument('--publish-interval', type=float, default=1.0, help=f'Seconds between forecast updates in {live_path}')
+    parser.add_argument('--flush-interval', type=float, default=30.0, help='Seconds between appends to the stores')
+    parser.add_argument('--workers', type=int, default=default_workers(), help='Worker processes for the initial fits')
+    parser.add_argument('--compact-files', type=int, default=8,
+                        help='Merge a ticker\'s store files once appends have left more than this many')
+    args = parser.parse_args()
+
+    tickers = args.tickers or list_tickers('prices')
+    prices = load_prices()
+    prices = prices[prices['Ticker'].isin(tickers)]
+    state = None
+    if args.feed == 'replay':
+        # Replayed bars are already in the stores: rebuild the state as of the
+        # replay start and keep the stores untouched
+        end = pd.Timestamp(prices['Date'].max())
+        start = pd.Timestamp(args.replay_from) if args.replay_from else end - pd.Timedelta(days=90)
+        prices = prices[prices['Date'] <= start]
+        feed = ReplayFeed(tickers, start, interval=args.interval)
+        persist = False
+        print(f'Replaying bars after {start.date()} every {args.interval}s')
+    else:
+        if os.path.exists(state_path):
+            state = {t: s for t, s in load_state(state_path).items() if t in tickers}
+        last_dates = {t: entry['last_date'] for t, entry in read_manifest('prices')['tickers'].items() if t in tickers}
+        feed = PollingFeed(tickers, sources[args.source](), last_dates, args.poll_interval)
+        persist = True
+    updater = LiveUpdater(args.horizon, args.models, persist, args.compact_files)
+    updater.start(prices.reset_index(drop=True), state, args.workers)
+    print(f'Streaming from the {feed.name} feed; forecasts are published to {live_path}')
+    try:
+        asyncio.run(run_stream(feed, updater, args.publish_interval, args.flush_interval))
+    except KeyboardInterrupt:
+        updater.flush()
+        print('Stopped.')
+    print(f'Processed {updater.bars} bars.')
@@ -0,0 +1,128 @@
+import os
+import time
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from instrumentation import take_spans, run_profiled, profile_path
+
+# Job-based runner for the modeling scripts.
+# Every (ticker, horizon, model) fit is an independent task that runs in its own
+# worker process, so a crash or hang in one fit never takes down the whole run.
+
+
+@dataclass
+class Task:
+    key: tuple
+    fn: object
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+
+
+@dataclass
+class TaskResult:
+    key: tuple
+    status: str  # 'ok', 'error', 'timeout' or 'crashed'
+    value: object = None
+    error: str = ''
+    wall_time: float = 0.0
+    spans: list = field(default_factory=list)  # instrumentation spans recorded by the task
+
+
+def _run_in_worker(conn, fn, args, kwargs, profile_to=None):
+    take_spans()  # drop spans inherited from the parent
+    start = time.perf_counter()
+    try:
+        if profile_to:
+            value = run_profiled(profile_to, fn, *args, **kwargs)
+        else:
+            value = fn(*args, **kwargs)
+        conn.send(('ok', value, '', time.perf_counter() - start, take_spans()))
+    except Exception:
+        conn.send(('error', None, traceback.format_exc(), time.perf_counter() - start, take_spans()))
+    finally:
+        conn.close()
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def run_tasks(tasks, workers=None, timeout=None, on_result=None, profile_dir=None):
+    # Runs tasks on a pool of at most `workers` processes. `timeout` (seconds) is
+    # enforced per task: a task that exceeds it is terminated and reported as
+    # 'timeout'. `on_result` is called in the parent as soon as each task finishes.
+    # With profile_dir set, every task is run under cProfile and dumped there.
+    workers = workers or default_workers()
+    ctx = mp.get_context()
+    pending = list(tasks)
+    pending.reverse()
+    running = {}  # conn -> (task, process, start)
+    results = []
+
+    def finish(result):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    while pending or running:
+        while pending and len(running) < workers:
+            task = pending.pop()
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            profile_to = profile_path(profile_dir, task.key) if profile_dir else None
+            process = ctx.Process(target=_run_in_worker, args=(child_conn, task.fn, task.args, task.kwargs, profile_to),
+                                  daemon=True)
+            process.start()
+            child_conn.close()
+            running[parent_conn] = (task, process, time.perf_counter())
+
+        ready = wait(list(running), timeout=1.0)
+        for conn in ready:
+            task, process, start = running.pop(conn)
+            try:
+                status, value, error, elapsed, spans = conn.recv()
+            except EOFError:
+                # The worker died without reporting back (segfault, OOM kill, ...)
+                process.join()
+                status, value, elapsed, spans = 'crashed', None, time.perf_counter() - start, []
+                error = f'worker exited with code {process.exitcode}'
+            conn.close()
+            process.join()
+            finish(TaskResult(task.key, status, value, error, elapsed, spans))
+
+        if timeout is not None:
+            now = time.perf_counter()
+            for conn, (task, process, start) in list(running.items()):
+                if now - start > timeout:
+                    process.terminate()
+                    process.join()
+                    conn.close()
+                    del running[conn]
+                    finish(TaskResult(task.key, 'timeout', error=f'exceeded {timeout}s', wall_time=now - start))
+
+    return results
+
+
+def print_timing_report(results, key_names, report_path=None):
+    # Prints per-task wall time (slowest first) and optionally saves it as CSV
+    rows = []
+    for r in results:
+        row = dict(zip(key_names, r.key))
+        row.update({'Status': r.status, 'Wall_Time_s': round(r.wall_time, 3)})
+        rows.append(row)
+    report = pd.DataFrame(rows, columns=list(key_names) + ['Status', 'Wall_Time_s'])
+    report = report.sort_values('Wall_Time_s', ascending=False)
+    print('\nPer-task wall time (slowest first):')
+    print(report.to_string(index=False))
+    print(f'Total task time: {report["Wall_Time_s"].sum():.1f}s across {len(report)} tasks')
+    for r in results:
+        if r.status != 'ok':
+            print(f'FAILED {r.key} ({r.status}): {r.error.strip().splitlines()[-1] if r.error else ""}')
+    if report_path:
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        report.to_csv(report_path, index=False)
+        print(f'Timing report saved as {report_path}')
+    return report
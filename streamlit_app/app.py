@@ -1,7 +1,16 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objs as go
 import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from data_store import read_store, read_manifest, list_tickers, store_version
+from downsampling import downsample
+from results_index import load_results_table, build_results_index, results_version, model_name
+from correlation import correlation_analytics, pair_rolling_correlation
 
 st.set_page_config(page_title='Advanced Stock Analysis & Forecasting', layout='wide', page_icon='📈')
 
@@ -17,9 +26,16 @@ st.markdown('''
 ''', unsafe_allow_html=True)
 
 # --- Helper Functions ---
-@st.cache_data
-def load_features():
-    return pd.read_csv('data/all_stocks_10y_features.csv')
+# Only the selected ticker's rows are read (ticker filter pushed down to its Parquet
+# partition, memory-mapped, only the columns the charts use). The cache is a bounded
+# LRU so memory stays flat however many tickers the store holds; `version` changes
+# whenever the features store is rewritten, which invalidates stale entries.
+feature_columns = ['Date', 'Close', 'SMA_20', 'SMA_50', 'EMA_20', 'RSI_14', 'MACD', 'MACD_Signal',
+                   'BB_Middle', 'BB_Upper', 'BB_Lower', 'Volatility_20']
+
+@st.cache_data(max_entries=8)
+def load_ticker_features(ticker, version):
+    return read_store('features', columns=feature_columns, tickers=[ticker], memory_map=True)
 
 @st.cache_data
 def load_model_results(ticker):
@@ -28,10 +44,47 @@ def load_model_results(ticker):
         return pd.read_csv(path)
     return None
 
+# Model results for every ticker x horizon x model are indexed once per version of
+# the model_results store, or of the merged CSVs it falls back to (cache_resource:
+# shared and not copied per rerun), so switching ticker or horizon is a dict
+# lookup with no file reads
+@st.cache_resource(max_entries=1)
+def get_results_index(version):
+    return build_results_index(load_results_table())
+
+# Live forecasts written by src/streaming.py. The fragment below reruns on its own
+# every `live_refresh_seconds`; the file is only re-read when its mtime changes,
+# so fresh forecasts show up within one publish interval plus one refresh.
+live_path = 'data/live/forecasts.json'
+live_refresh_seconds = 2
+
+@st.cache_data(max_entries=1)
+def load_live_forecasts(version):
+    with open(live_path) as f:
+        return json.load(f)
+
+# Return correlations, clusters and top pairs for the whole universe, computed once
+# per version of the features store and lookback (blocked NumPy, see src/correlation.py)
+max_heatmap_tickers = 100
+
+@st.cache_resource(max_entries=3)
+def get_correlation_analytics(version, start):
+    prices = read_store('features', columns=['Date', 'Close'], memory_map=True)
+    return correlation_analytics(prices, start=start)
+
 @st.cache_data
-def get_available_tickers():
-    df = load_features()
-    return sorted(df['Ticker'].unique())
+def get_available_tickers(version):
+    # Ticker list comes from the store manifest, not from the data itself
+    return sorted(list_tickers('features'))
+
+# --- Chart Downsampling ---
+# Every trace goes through downsample() so at most `max_chart_points` points per
+# trace reach the browser; narrowing the visible date range brings back full detail.
+def chart_data(df, columns, x_column='Date'):
+    return downsample(df, x_column, columns, max_chart_points, method=downsample_method)
+
+def line(data, column, x_column='Date', **kwargs):
+    return go.Scatter(x=data[x_column], y=data[column], mode='lines', **kwargs)
 
 # --- Company Name Mapping ---
 ticker_to_name = {
@@ -57,12 +110,14 @@ page = st.sidebar.radio('Go to:', [
     'EDA & Indicators',
     'Forecasting',
     'Summary & Insights',
+    'Correlations',
     'How to Read Charts'
 ])
 st.sidebar.markdown('---')
 
 # Build a list of display names for the selectbox
-available_tickers = get_available_tickers()
+features_version = store_version('features')
+available_tickers = get_available_tickers(features_version)
 ticker_display_names = [f"{ticker_to_name.get(t, t)} ({t})" for t in available_tickers]
 selected_display = st.sidebar.selectbox('Select Stock', ticker_display_names, index=0)
 # Extract ticker from display name
@@ -75,27 +130,48 @@ st.sidebar.markdown('Select Forecast Horizon (days)')
 forecast_horizons = [7, 30, 90, 180]
 horizon = st.sidebar.selectbox('Forecast Horizon', forecast_horizons, index=forecast_horizons.index(30))
 
+# --- Chart Detail ---
+st.sidebar.markdown('---')
+chart_detail = st.sidebar.selectbox('Chart detail (points per line)', ['Auto (1000)', '500', '2000', 'Full resolution'], index=0)
+max_chart_points = None if chart_detail == 'Full resolution' else int(chart_detail.split('(')[-1].rstrip(')'))
+downsample_method = 'minmax' if st.sidebar.checkbox('Keep spikes (min/max sampling)', value=False) else 'lttb'
+
+@st.fragment(run_every=live_refresh_seconds)
+def live_forecast_panel(ticker):
+    if not os.path.exists(live_path):
+        return
+    live = load_live_forecasts(os.path.getmtime(live_path)).get('tickers', {}).get(ticker)
+    if live is None:
+        return
+    st.subheader('🔴 Live Forecast')
+    st.caption(f"Streaming update as of {live['as_of']} (close {live['close']:.2f}); refreshes every {live_refresh_seconds}s")
+    fig = go.Figure()
+    colors = {'ARIMA': '#FF6347', 'SARIMA': '#00BFFF'}
+    for model, values in live['forecasts'].items():
+        fig.add_trace(go.Scatter(x=live['dates'], y=values, mode='lines', name=model,
+                                 line=dict(color=colors.get(model, '#FFA500'), dash='dash', width=2)))
+    fig.update_layout(title=f"Next {len(live['dates'])} trading days", xaxis_title='Date', yaxis_title='Close Price', template='plotly_dark')
+    st.plotly_chart(fig, use_container_width=True)
+
 # --- Main Content ---
 st.markdown('<div style="background:linear-gradient(90deg,#00BFFF 0,#22232A 100%);padding:2em 1em 1em 1em;border-radius:16px;margin-bottom:2em;">\
 <h1 style="color:#fff;font-size:2.5em;font-weight:800;margin-bottom:0.2em;">Advanced Stock Analysis & Forecasting App</h1>\
 <p style="color:#F5F6F7;font-size:1.2em;">Interactive stock analysis and forecasting using ARIMA, Prophet, and SARIMA models. Select a stock and explore technical indicators, model predictions, and actionable insights.</p>\
 </div>', unsafe_allow_html=True)
 
-# --- Load Data ---
-df = load_features()
-df_stock = df[df['Ticker'] == ticker].copy()
-
-def load_model_results_horizon(ticker, horizon):
-    path = f'data/model_outputs/{ticker}_all_models_results_{horizon}.csv'
-    if os.path.exists(path):
-        return pd.read_csv(path)
-    return None
-
-model_results = load_model_results_horizon(ticker, horizon)
+results_entry = get_results_index(results_version()).get((ticker, horizon))
+model_results = results_entry['rows'] if results_entry is not None else None
 
 # --- EDA & Indicators Page ---
 if page.startswith('EDA'):
     st.header(f'Exploratory Data Analysis & Technical Indicators: {company_name} ({ticker})')
+    # Features are only loaded on the page that charts them
+    df_stock = load_ticker_features(ticker, features_version)
+    # Visible date range: charts are downsampled within it, so zooming in here
+    # shows full daily resolution once the range fits the point budget
+    first_date, last_date = df_stock['Date'].min().date(), df_stock['Date'].max().date()
+    visible_range = st.slider('Visible date range', min_value=first_date, max_value=last_date, value=(first_date, last_date))
+    df_view = df_stock[(df_stock['Date'].dt.date >= visible_range[0]) & (df_stock['Date'].dt.date <= visible_range[1])]
     st.info('This section helps you understand the stock\'s behavior using popular technical indicators. Each chart includes a tip on what to look for.')
     # --- Metrics Row ---
     col1, col2, col3 = st.columns(3)
@@ -110,11 +186,12 @@ if page.startswith('EDA'):
         - Price crossing above SMA/EMA: possible uptrend (buy signal)
         - Price crossing below: possible downtrend (sell signal)
         ''')
+    data = chart_data(df_view, ['Close', 'SMA_20', 'SMA_50', 'EMA_20'])
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['Close'], mode='lines', name='Close', line=dict(color='#00BFFF', width=2)))
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['SMA_20'], mode='lines', name='SMA 20', line=dict(color='#FFA500', width=2)))
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['SMA_50'], mode='lines', name='SMA 50', line=dict(color='#32CD32', width=2)))
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['EMA_20'], mode='lines', name='EMA 20', line=dict(color='#FF6347', width=2)))
+    fig.add_trace(line(data, 'Close', name='Close', line=dict(color='#00BFFF', width=2)))
+    fig.add_trace(line(data, 'SMA_20', name='SMA 20', line=dict(color='#FFA500', width=2)))
+    fig.add_trace(line(data, 'SMA_50', name='SMA 50', line=dict(color='#32CD32', width=2)))
+    fig.add_trace(line(data, 'EMA_20', name='EMA 20', line=dict(color='#FF6347', width=2)))
     fig.update_layout(title='Close Price with SMA & EMA', xaxis_title='Date', yaxis_title='Price', legend_title='Legend',
                      font=dict(size=14), template='plotly_dark', xaxis=dict(showgrid=True), yaxis=dict(showgrid=True),
                      margin=dict(l=40, r=40, t=60, b=40))
@@ -126,8 +203,9 @@ if page.startswith('EDA'):
         - RSI above 70: overbought (stock may decrease soon)
         - RSI below 30: oversold (stock may increase soon)
         ''')
+    data = chart_data(df_view, ['RSI_14'])
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['RSI_14'], mode='lines', name='RSI 14', line=dict(color='#A020F0', width=2)))
+    fig.add_trace(line(data, 'RSI_14', name='RSI 14', line=dict(color='#A020F0', width=2)))
     fig.add_hline(y=70, line_dash='dash', line_color='red', annotation_text='Overbought (70)', annotation_position='top left')
     fig.add_hline(y=30, line_dash='dash', line_color='green', annotation_text='Oversold (30)', annotation_position='bottom left')
     fig.update_layout(title='RSI (14)', xaxis_title='Date', yaxis_title='RSI', font=dict(size=14), template='plotly_dark', xaxis=dict(showgrid=True), yaxis=dict(showgrid=True),
@@ -140,9 +218,10 @@ if page.startswith('EDA'):
         - MACD crossing above Signal Line: possible uptrend (buy signal)
         - MACD crossing below: possible downtrend (sell signal)
         ''')
+    data = chart_data(df_view, ['MACD', 'MACD_Signal'])
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['MACD'], mode='lines', name='MACD', line=dict(color='#00BFFF', width=2)))
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['MACD_Signal'], mode='lines', name='Signal Line', line=dict(color='#FF6347', width=2)))
+    fig.add_trace(line(data, 'MACD', name='MACD', line=dict(color='#00BFFF', width=2)))
+    fig.add_trace(line(data, 'MACD_Signal', name='Signal Line', line=dict(color='#FF6347', width=2)))
     fig.update_layout(title='MACD', xaxis_title='Date', yaxis_title='MACD', font=dict(size=14), template='plotly_dark', xaxis=dict(showgrid=True), yaxis=dict(showgrid=True),
                      margin=dict(l=40, r=40, t=60, b=40))
     st.plotly_chart(fig, use_container_width=True)
@@ -154,22 +233,14 @@ if page.startswith('EDA'):
         - Price touching lower band: stock may be oversold (could increase)
         - Wide bands: high volatility; narrow bands: low volatility
         ''')
+    data = chart_data(df_view, ['Close', 'BB_Middle', 'BB_Upper', 'BB_Lower'])
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['Close'], mode='lines', name='Close', line=dict(color='#00BFFF', width=2)))
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['BB_Middle'], mode='lines', name='BB Middle', line=dict(color='#FFA500', width=2)))
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['BB_Upper'], mode='lines', name='BB Upper', line=dict(color='#32CD32', width=2, dash='dash')))
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['BB_Lower'], mode='lines', name='BB Lower', line=dict(color='#FF6347', width=2, dash='dash')))
-    fig.add_traces([
-        go.Scatter(
-            x=pd.concat([df_stock['Date'], df_stock['Date'][::-1]]),
-            y=pd.concat([df_stock['BB_Upper'], df_stock['BB_Lower'][::-1]]),
-            fill='toself',
-            fillcolor='rgba(0,191,255,0.1)',
-            line=dict(color='rgba(255,255,255,0)'),
-            hoverinfo='skip',
-            showlegend=False
-        )
-    ])
+    fig.add_trace(line(data, 'Close', name='Close', line=dict(color='#00BFFF', width=2)))
+    fig.add_trace(line(data, 'BB_Middle', name='BB Middle', line=dict(color='#FFA500', width=2)))
+    fig.add_trace(line(data, 'BB_Upper', name='BB Upper', line=dict(color='#32CD32', width=2, dash='dash')))
+    # Band shading fills down to the upper band trace instead of a reversed polygon
+    fig.add_trace(line(data, 'BB_Lower', name='BB Lower', line=dict(color='#FF6347', width=2, dash='dash'),
+                       fill='tonexty', fillcolor='rgba(0,191,255,0.1)'))
     fig.update_layout(title='Bollinger Bands', xaxis_title='Date', yaxis_title='Price', font=dict(size=14), template='plotly_dark', xaxis=dict(showgrid=True), yaxis=dict(showgrid=True))
     st.plotly_chart(fig, use_container_width=True)
     # --- Volatility ---
@@ -179,8 +250,9 @@ if page.startswith('EDA'):
         - High volatility = bigger price swings (riskier)
         - Low volatility = stable price
         ''')
+    data = chart_data(df_view, ['Volatility_20'])
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df_stock['Date'], y=df_stock['Volatility_20'], mode='lines', name='20-day Volatility', line=dict(color='#8B4513', width=2)))
+    fig.add_trace(line(data, 'Volatility_20', name='20-day Volatility', line=dict(color='#8B4513', width=2)))
     fig.update_layout(title='20-day Rolling Volatility', xaxis_title='Date', yaxis_title='Volatility', font=dict(size=14), template='plotly_dark', xaxis=dict(showgrid=True), yaxis=dict(showgrid=True))
     st.plotly_chart(fig, use_container_width=True)
 
@@ -189,16 +261,19 @@ elif page.startswith('Forecasting'):
     st.header(f'🤖 Model Forecasts: {company_name} ({ticker})')
     if model_results is not None:
         st.info('Compare model predictions for the selected forecast horizon. Download the data or hover for details!')
-        models = ['ARIMA_Forecast', 'SARIMA_Forecast']
-        model_display_names = {'ARIMA_Forecast': 'ARIMA', 'SARIMA_Forecast': 'SARIMA'}
-        selected_models = st.multiselect('Select models to display:', [model_display_names[m] for m in models], default=[model_display_names[m] for m in models])
+        models = results_entry['models']
+        model_display_names = {m: model_name(m) for m in models}
+        default_models = [model_display_names[m] for m in models if m in ('ARIMA_Forecast', 'SARIMA_Forecast')]
+        selected_models = st.multiselect('Select models to display:', [model_display_names[m] for m in models],
+                                         default=default_models or [model_display_names[m] for m in models])
+        data = chart_data(model_results, ['Actual'])
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=model_results['Date'], y=model_results['Actual'], mode='lines', name='Actual', line=dict(color='#F5F6F7', width=2)))
-        colors = ['#FF6347', '#00BFFF']
+        fig.add_trace(line(data, 'Actual', name='Actual', line=dict(color='#F5F6F7', width=2)))
+        colors = ['#FF6347', '#32CD32', '#00BFFF', '#FFA500', '#A020F0']
         for i, m in enumerate(models):
             display_name = model_display_names[m]
-            if display_name in selected_models and m in model_results.columns:
-                fig.add_trace(go.Scatter(x=model_results['Date'], y=model_results[m], mode='lines', name=display_name, line=dict(color=colors[i], dash='dash', width=2)))
+            if display_name in selected_models:
+                fig.add_trace(line(data, m, name=display_name, line=dict(color=colors[i % len(colors)], dash='dash', width=2)))
         fig.update_layout(title='Actual vs. Model Forecasts', xaxis_title='Date', yaxis_title='Close Price', template='plotly_dark')
         st.plotly_chart(fig, use_container_width=True)
         # Downloadable CSV
@@ -210,36 +285,32 @@ elif page.startswith('Forecasting'):
         )
         # Trend signal
         st.subheader('📊 Model Trend Signal')
-        last_row = model_results.iloc[-1]
-        prev_row = model_results.iloc[-2]
         for i, m in enumerate(models):
             display_name = model_display_names[m]
-            if display_name in selected_models and m in model_results.columns:
-                trend = '↑' if last_row[m] > prev_row[m] else '↓'
-                st.markdown(f"**{display_name}:** {trend} ({'Up' if trend=='↑' else 'Down'})")
+            if display_name in selected_models and m in results_entry['trend']:
+                trend = results_entry['trend'][m]
+                st.markdown(f"**{display_name}:** {'↑' if trend == 'Up' else '↓'} ({trend})")
+        # Error metrics over the test window
+        st.subheader('🎯 Forecast Error')
+        st.dataframe(results_entry['metrics'].style.format('{:.2f}'), use_container_width=True)
     else:
         st.warning('No model results available for this stock.')
+    live_forecast_panel(ticker)
 
 # --- Summary & Insights Page ---
 elif page.startswith('Summary'):
     st.header(f'💡 Summary & Insights: {company_name} ({ticker})')
     st.info('Use the trend arrows to quickly see if the models expect the stock to go up or down. Use the EDA page to understand why (look for overbought/oversold, volatility, etc). Use the Forecasting page to compare models and see which is most accurate.')
     if model_results is not None:
-        last_row = model_results.iloc[-1]
-        prev_row = model_results.iloc[-2]
-        models = ['ARIMA_Forecast', 'SARIMA_Forecast']
-        model_display_names = {'ARIMA_Forecast': 'ARIMA', 'SARIMA_Forecast': 'SARIMA'}
+        latest = results_entry['latest']
+        models = [m for m in ['ARIMA_Forecast', 'SARIMA_Forecast'] if m in results_entry['models']]
         col1, col2, col3 = st.columns(3)
         for i, m in enumerate(models):
-            display_name = model_display_names[m]
-            if m in model_results.columns:
-                trend = '↑' if last_row[m] > prev_row[m] else '↓'
-                col1.metric(f'{display_name} Trend', f"{trend}")
-        col2.metric('Actual', f"{last_row['Actual']:.2f}")
+            if m in results_entry['trend']:
+                col1.metric(f'{model_name(m)} Trend', '↑' if results_entry['trend'][m] == 'Up' else '↓')
+        col2.metric('Actual', f"{latest['Actual']:.2f}")
         for i, m in enumerate(models):
-            display_name = model_display_names[m]
-            if m in model_results.columns:
-                col3.metric(display_name, f"{last_row[m]:.2f}")
+            col3.metric(model_name(m), f"{latest[m]:.2f}")
         st.download_button(
             label='⬇️ Download Forecast Data as CSV',
             data=model_results.to_csv(index=False).encode('utf-8'),
@@ -249,6 +320,68 @@ elif page.startswith('Summary'):
     else:
         st.warning('No model results available for this stock.')
 
+# --- Correlations Page ---
+elif page.startswith('Correlations'):
+    st.header(f'🔗 Correlations: {company_name} ({ticker})')
+    st.info('Correlations of daily log returns across all stocks. Highly correlated stocks tend to move together, so they add less diversification.')
+    lookbacks = {'Full history': None, '5 years': 5, '1 year': 1}
+    lookback = st.selectbox('Lookback', list(lookbacks), index=0)
+    start = None
+    if lookbacks[lookback]:
+        end = max(entry['last_date'] for entry in read_manifest('features')['tickers'].values())
+        start = (pd.Timestamp(end) - pd.DateOffset(years=lookbacks[lookback])).strftime('%Y-%m-%d')
+    analytics = get_correlation_analytics(features_version, start)
+    tickers, corr = analytics['tickers'], analytics['corr']
+    col1, col2, col3 = st.columns(3)
+    col1.metric('Stocks', len(tickers))
+    col2.metric('Trading days', len(analytics['dates']))
+    col3.metric('Clusters', analytics['clusters']['Cluster'].nunique())
+    # --- Heatmap (cluster order) ---
+    st.subheader('Correlation Heatmap')
+    # The selected stock may be missing from the matrix (no returns in the lookback)
+    i = tickers.index(ticker) if ticker in tickers else None
+    order = list(analytics['order'])
+    if len(order) > max_heatmap_tickers and i is not None:
+        # Large universes: only the stocks most correlated with the selected one
+        nearest = set(np.argsort(-np.nan_to_num(np.abs(corr[i]), nan=-1))[:max_heatmap_tickers])
+        order = [j for j in order if j in nearest]
+        st.caption(f'Showing the {max_heatmap_tickers} stocks most correlated with {ticker}, in cluster order.')
+    elif len(order) > max_heatmap_tickers:
+        order = order[:max_heatmap_tickers]
+        st.caption(f'Showing the first {max_heatmap_tickers} stocks in cluster order.')
+    labels = [tickers[j] for j in order]
+    fig = go.Figure(go.Heatmap(z=corr[np.ix_(order, order)], x=labels, y=labels, zmin=-1, zmax=1, colorscale='RdBu_r'))
+    fig.update_layout(template='plotly_dark', height=600, margin=dict(l=40, r=40, t=40, b=40))
+    st.plotly_chart(fig, use_container_width=True)
+    # --- Top pairs and nearest stocks ---
+    col1, col2 = st.columns(2)
+    col1.subheader('Most Correlated Pairs')
+    col1.dataframe(analytics['top_pairs'].style.format({'Correlation': '{:.2f}'}), use_container_width=True)
+    col2.subheader(f'Most Correlated with {ticker}')
+    if i is None:
+        nearest = pd.DataFrame(columns=['Ticker', 'Correlation'])
+        col2.info(f'{ticker} has no returns in this lookback, so it is not in the correlation matrix.')
+    else:
+        nearest = pd.DataFrame({'Ticker': tickers, 'Correlation': corr[i]}).drop(index=i).dropna()
+        nearest = nearest.sort_values('Correlation', ascending=False).head(10).reset_index(drop=True)
+        col2.dataframe(nearest.style.format({'Correlation': '{:.2f}'}), use_container_width=True)
+    # --- Rolling correlation ---
+    st.subheader('Rolling Correlation')
+    if len(nearest):
+        partner = st.selectbox('Compare with', list(nearest['Ticker']) + [t for t in tickers if t != ticker and t not in set(nearest['Ticker'])])
+        window = st.select_slider('Window (trading days)', [20, 60, 120, 250], value=60)
+        returns = analytics['returns']
+        rolling = pd.DataFrame({'Date': analytics['dates'],
+                                'Correlation': pair_rolling_correlation(returns[:, i], returns[:, tickers.index(partner)], window)})
+        data = chart_data(rolling.dropna(), ['Correlation'])
+        fig = go.Figure()
+        fig.add_trace(line(data, 'Correlation', name=f'{ticker} vs {partner}', line=dict(color='#00BFFF', width=2)))
+        fig.update_layout(title=f'{window}-day Rolling Correlation: {ticker} vs {partner}', xaxis_title='Date', yaxis_title='Correlation',
+                          yaxis=dict(range=[-1, 1]), template='plotly_dark')
+        st.plotly_chart(fig, use_container_width=True)
+    with st.expander('Clusters'):
+        st.dataframe(analytics['clusters'], use_container_width=True)
+
 # --- How to Read Charts Page ---
 elif page.startswith('How'):
     st.header('📚 How to Read the Charts')
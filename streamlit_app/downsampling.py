@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# Server-side downsampling for the dashboard charts.
+# Plotly serializes every point of every trace to the browser, so long daily (or
+# intraday) histories are reduced to roughly the number of points the chart can
+# actually show before they are handed to go.Scatter.
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, from each
+    # bucket in between, the point that forms the largest triangle with the point
+    # kept from the previous bucket and the average of the next bucket.
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        area = np.abs((x[previous] - next_x) * (bucket_y - y[previous])
+                      - (x[previous] - bucket_x) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y, n_out):
+    # Min/max bucketing: the lowest and highest point of every bucket (keeps spikes)
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    buckets = n_out // 2
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    bucket_id = np.repeat(np.arange(buckets), np.diff(edges))
+    order = np.lexsort((y, bucket_id))
+    first = order[edges[:-1]]
+    last = order[edges[1:] - 1]
+    return np.unique(np.r_[first, last, 0, n - 1])
+
+
+def downsample(df, x_column, y_columns, max_points, method='lttb'):
+    # Returns the rows of df to plot for a chart whose traces are y_columns. The
+    # points are chosen on the first (primary) column and shared by every trace on
+    # the chart so overlays and fills stay aligned. Rows where the primary column
+    # is missing are skipped. max_points=None keeps full resolution.
+    if max_points is None or len(df) <= max_points:
+        return df
+    primary = df[y_columns[0]].to_numpy(dtype=float)
+    valid = np.flatnonzero(~np.isnan(primary))
+    if len(valid) <= max_points:
+        return df.iloc[valid]
+    x = pd.to_datetime(df[x_column]).to_numpy().astype('int64').astype(float)[valid]
+    y = primary[valid]
+    if method == 'minmax':
+        keep = minmax_indices(y, max_points)
+    else:
+        keep = lttb_indices(x, y, max_points)
+    return df.iloc[valid[keep]]
@@ -0,0 +1,78 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+
+from data_store import read_store, store_exists, store_version
+
+# In-memory index of the merged model results for the dashboard.
+# Built once from the model_results store (all tickers x horizons x models):
+# every (ticker, horizon) entry holds its result rows plus precomputed latest
+# values, trend direction and error metrics per model, so switching ticker or
+# horizon is a dict lookup instead of a file read.
+
+metric_names = ['MAE', 'RMSE', 'MAPE']
+results_csv_pattern = 'data/model_outputs/*_all_models_results_*.csv'
+
+
+def load_results_table():
+    # Long table (Ticker, Date, Horizon, Actual, *_Forecast) of every merged result.
+    # Falls back to the merged CSVs when merge_model_results.py has not written the store yet.
+    if store_exists('model_results'):
+        return read_store('model_results').astype({'Ticker': str})
+    frames = [pd.read_csv(path, parse_dates=['Date']) for path in sorted(glob.glob(results_csv_pattern))]
+    if not frames:
+        return pd.DataFrame(columns=['Ticker', 'Date', 'Horizon', 'Actual'])
+    return pd.concat(frames, ignore_index=True).astype({'Ticker': str})
+
+
+def results_version():
+    # Cache key for the index: the store's version, or the merged CSVs' mtimes under
+    # the CSV fallback (store_version is None there, so it would never change)
+    if store_exists('model_results'):
+        return store_version('model_results')
+    return tuple((path, os.path.getmtime(path)) for path in sorted(glob.glob(results_csv_pattern)))
+
+
+def model_name(column):
+    return column[:-len('_Forecast')]
+
+
+def build_results_index(results):
+    # Returns {(ticker, horizon): {'rows', 'models', 'latest', 'trend', 'metrics'}}
+    keys = ['Ticker', 'Horizon']
+    columns = [c for c in results.columns if c.endswith('_Forecast')]
+    if results.empty or not columns:
+        return {}  # nothing merged yet: every page shows its 'No model results' warning
+    results = results.sort_values(keys + ['Date'], kind='stable').reset_index(drop=True)
+
+    # Error metrics for all tickers, horizons and models at once
+    actual = results['Actual'].to_numpy(dtype=float)[:, None]
+    errors = results[columns].to_numpy(dtype=float) - actual
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct_errors = np.abs(errors / actual) * 100
+    parts = {'MAE': np.abs(errors), 'RMSE': errors ** 2, 'MAPE': pct_errors}
+    errors = pd.DataFrame(np.hstack([parts[m] for m in metric_names]),
+                          columns=pd.MultiIndex.from_product([metric_names, columns]))
+    metrics = errors.groupby([results[key] for key in keys], sort=False).mean()
+    metrics['RMSE'] = np.sqrt(metrics['RMSE'])
+
+    index = {}
+    for (ticker, horizon), rows in results.groupby(keys, sort=False):
+        rows = rows.drop(columns=keys).reset_index(drop=True)
+        models = [c for c in columns if rows[c].notna().any()]
+        last, previous = rows.iloc[-1], rows.iloc[-2] if len(rows) > 1 else rows.iloc[-1]
+        trend = {}
+        for column in models:
+            if pd.notna(last[column]) and pd.notna(previous[column]):
+                trend[column] = 'Up' if last[column] > previous[column] else 'Down'
+        row_metrics = metrics.loc[(ticker, horizon)]
+        index[(ticker, int(horizon))] = {
+            'rows': rows[['Date', 'Actual'] + models],
+            'models': models,
+            'latest': last[['Actual'] + models].to_dict(),
+            'trend': trend,
+            'metrics': pd.DataFrame({name: [row_metrics[(name, c)] for c in models] for name in metric_names},
+                                    index=[model_name(c) for c in models]),
+        }
+    return index
@@ -0,0 +1,27 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+repo_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(repo_dir, 'src'))
+from data_store import write_store
+
+
+def test_correlations_page_without_selected_ticker(tmp_path, monkeypatch):
+    # BBB has no usable closes, so it is not in the correlation matrix
+    monkeypatch.chdir(tmp_path)
+    dates = pd.bdate_range('2023-01-02', periods=120)
+    rng = np.random.default_rng(0)
+    frames = [pd.DataFrame({'Date': dates, 'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates)))), 'Ticker': t})
+              for t in ['AAA', 'CCC']]
+    frames.append(pd.DataFrame({'Date': dates, 'Close': np.nan, 'Ticker': 'BBB'}))
+    write_store(pd.concat(frames, ignore_index=True), 'features')
+
+    app = AppTest.from_file(os.path.join(repo_dir, 'streamlit_app', 'app.py'), default_timeout=60)
+    app.run()
+    app.sidebar.radio[0].set_value('Correlations')
+    app.sidebar.selectbox[0].set_value('BBB (BBB)').run()
+    assert not app.exception
+    assert any('not in the correlation matrix' in info.value for info in app.info)
@@ -0,0 +1,54 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from data_store import read_store, read_manifest
+from downloader import LocalCSVSource
+from download_and_eda import update_prices
+
+
+class FailingSource(LocalCSVSource):
+    # Local source whose fetches of `failing` tickers always raise
+    def __init__(self, failing, **kwargs):
+        super().__init__(**kwargs)
+        self.failing = set(failing)
+
+    def fetch(self, tickers, start, end):
+        if self.failing & set(tickers):
+            raise RuntimeError('fetch failed')
+        return super().fetch(tickers, start, end)
+
+
+def write_prices(directory, tickers, periods=30):
+    os.makedirs(directory, exist_ok=True)
+    dates = pd.bdate_range('2023-01-02', periods=periods)
+    for i, ticker in enumerate(tickers):
+        close = 100.0 + i + np.arange(periods)
+        pd.DataFrame({'Date': dates, 'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                      'Volume': 1000.0}).to_csv(os.path.join(directory, f'{ticker}_10y.csv'), index=False)
+
+
+def test_full_refresh_of_subset_keeps_other_tickers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_prices('data', ['AAA', 'BBB', 'CCC'])
+    update_prices(['AAA', 'BBB', 'CCC'], LocalCSVSource(), '2023-01-01', '2024-01-01', retries=0)
+
+    # Full refresh of AAA only, with changed prices
+    write_prices('data', ['AAA'], periods=20)
+    update_prices(['AAA'], LocalCSVSource(), '2023-01-01', '2024-01-01', retries=0, incremental=False)
+    prices = read_store('prices').astype({'Ticker': str})
+    assert prices.groupby('Ticker').size().to_dict() == {'AAA': 20, 'BBB': 30, 'CCC': 30}
+    assert read_manifest('prices')['tickers']['AAA']['rows'] == 20
+
+
+def test_full_refresh_keeps_history_of_failed_chunks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_prices('data', ['AAA', 'BBB'])
+    update_prices(['AAA', 'BBB'], LocalCSVSource(), '2023-01-01', '2024-01-01', retries=0)
+
+    update_prices(['AAA', 'BBB'], FailingSource(['BBB']), '2023-01-01', '2024-01-01', chunk_size=1, retries=0,
+                  incremental=False)
+    prices = read_store('prices').astype({'Ticker': str})
+    assert prices.groupby('Ticker').size().to_dict() == {'AAA': 30, 'BBB': 30}
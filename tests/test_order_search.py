@@ -0,0 +1,21 @@
+import os
+import sys
+import warnings
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from order_search import needs_search, grid_config, recent_volatility
+
+
+def test_zero_cached_volatility_needs_search():
+    flat = np.full(300, 50.0)
+    entry = {'grid': grid_config('ARIMA'), 'rows': len(flat), 'volatility': recent_volatility(flat)}
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')  # no division by zero
+        assert needs_search(entry, 'ARIMA', flat) is not None
+
+
+def test_unchanged_series_keeps_cached_order():
+    values = 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, 300)))
+    entry = {'grid': grid_config('ARIMA'), 'rows': len(values), 'volatility': recent_volatility(values)}
+    assert needs_search(entry, 'ARIMA', values) is None
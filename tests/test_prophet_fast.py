@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+def run_fit(fast):
+    # Fresh interpreter, so cmdstanpy sets up its logger exactly as in a model run
+    code = textwrap.dedent(f'''
+        import sys
+        sys.path.insert(0, {src_dir!r})
+        import numpy as np
+        import pandas as pd
+        from model_arima_prophet import fit_prophet
+        dates = pd.bdate_range('2022-01-03', periods=300, name='Date')
+        train = pd.Series(100 + np.cumsum(np.random.default_rng(0).normal(0, 1, 300)), index=dates, name='Close')
+        fit_prophet(train, 7, fast={fast})
+        fit_prophet(train, 30, fast={fast})
+    ''')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return result.stdout + result.stderr
+
+
+def test_fast_mode_emits_no_cmdstanpy_info():
+    assert 'cmdstanpy - INFO' not in run_fit(fast=True)
+    # The standard mode still logs, so the check above can see the records
+    assert 'cmdstanpy - INFO' in run_fit(fast=False)
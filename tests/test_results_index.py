@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+repo_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(repo_dir, 'src'))
+sys.path.insert(0, os.path.join(repo_dir, 'streamlit_app'))
+from data_store import write_store
+from results_index import load_results_table, build_results_index, results_version
+
+
+def write_features(tickers=('AAA',), periods=30):
+    dates = pd.bdate_range('2023-01-02', periods=periods)
+    write_store(pd.concat([pd.DataFrame({'Date': dates, 'Close': 100.0 + pd.Series(range(periods)), 'Ticker': t})
+                           for t in tickers], ignore_index=True), 'features')
+
+
+def test_empty_results_give_empty_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert build_results_index(load_results_table()) == {}
+
+
+def test_app_shows_warning_without_model_results(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_features()
+    app = AppTest.from_file(os.path.join(repo_dir, 'streamlit_app', 'app.py'), default_timeout=60)
+    app.run()
+    app.sidebar.radio[0].set_value('Forecasting').run()
+    assert not app.exception
+    assert any('No model results' in w.value for w in app.warning)
+
+
+def test_results_version_follows_merged_csvs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('data/model_outputs')
+    path = 'data/model_outputs/AAA_all_models_results_7.csv'
+    pd.DataFrame({'Date': ['2023-01-02'], 'Horizon': [7], 'Ticker': ['AAA'], 'Actual': [1.0],
+                  'ARIMA_Forecast': [1.1]}).to_csv(path, index=False)
+    before = results_version()
+    assert before is not None
+    later = time.time() + 10
+    os.utime(path, (later, later))
+    assert results_version() != before
+    assert list(build_results_index(load_results_table())) == [('AAA', 7)]
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from data_store import write_store, read_store, read_manifest, partition_files
+from downloader import PriceSource
+from streaming import LiveUpdater, PollingFeed
+
+
+def price_rows(ticker, dates, start=100.0):
+    return [{'Date': date, 'Open': start + i, 'High': start + i + 1, 'Low': start + i - 1, 'Close': start + i,
+             'Volume': 1000.0, 'Ticker': ticker} for i, date in enumerate(dates)]
+
+
+def test_flush_keeps_partition_file_count_bounded(tmp_path, monkeypatch):
+    # The stores live under data/store relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    dates = pd.bdate_range('2024-01-01', periods=60)
+    history = pd.DataFrame(price_rows('AAA', dates[:20]))
+    write_store(history, 'prices')
+    write_store(history.assign(SMA_20=history['Close']), 'features')
+
+    updater = LiveUpdater(persist=True, compact_files=4)
+    for i, date in enumerate(dates[20:]):
+        updater.new_rows = [{**price_rows('AAA', [date], start=120.0 + i)[0], 'SMA_20': 120.0 + i}]
+        updater.flush()
+        for name in ['prices', 'features']:
+            assert len(partition_files(name, 'AAA')) <= 4
+
+    for name in ['prices', 'features']:
+        stored = read_store(name, tickers=['AAA'])
+        assert len(stored) == len(dates)
+        assert list(stored['Date']) == list(dates)
+        assert read_manifest(name)['tickers']['AAA']['rows'] == len(dates)
+    assert read_store('features')['SMA_20'].iloc[-1] == 159.0
+
+
+class TodaySource(PriceSource):
+    # Serves every day up to and including today, ignoring the requested end
+    def fetch(self, tickers, start, end):
+        dates = pd.date_range(start, pd.Timestamp.today().normalize())
+        return {t: pd.DataFrame(price_rows(t, dates)).drop(columns='Ticker') for t in tickers}
+
+
+def test_polling_feed_skips_bar_still_in_progress():
+    today = pd.Timestamp.today().normalize()
+    feed = PollingFeed(['AAA'], TodaySource(), {'AAA': today - pd.Timedelta(days=3)}, poll_interval=60)
+
+    async def first_poll():
+        bars, stream = [], feed.bars()
+        try:
+            while True:
+                bars.append(await asyncio.wait_for(stream.__anext__(), 1.0))
+        except asyncio.TimeoutError:
+            return bars
+
+    dates = [pd.Timestamp(bar['Date']) for _, bar in asyncio.run(first_poll())]
+    assert dates == [today - pd.Timedelta(days=2), today - pd.Timedelta(days=1)]